@@ -2,7 +2,7 @@
 Router principal de la API v1
 """
 from fastapi import APIRouter
-from api.v1 import products, sales, customers, auth, config, imports, returns, inventory_alerts
+from api.v1 import products, sales, customers, auth, config, imports, returns, inventory_alerts, dashboard
 
 api_router = APIRouter()
 
@@ -15,3 +15,4 @@ api_router.include_router(config.router, prefix="/config", tags=["Configuración
 api_router.include_router(imports.router, prefix="/imports", tags=["Imports"])
 api_router.include_router(returns.router, prefix="/returns", tags=["Devoluciones"])
 api_router.include_router(inventory_alerts.router, prefix="/inventory-alerts", tags=["Alertas de Inventario"])
+api_router.include_router(dashboard.router, prefix="/dashboard", tags=["Dashboard"])
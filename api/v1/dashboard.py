@@ -0,0 +1,80 @@
+"""
+Endpoints del Dashboard
+"""
+import asyncio
+from typing import Awaitable, Callable
+
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.session import AsyncSessionLocal
+from core.security import get_current_user
+from models.user import User
+from schemas.dashboard import DashboardSummary
+from schemas.sale import TodayStats, SaleList, TopProducts
+from schemas.inventory_alert import AlertStats
+from api.v1 import sales, inventory_alerts
+
+router = APIRouter()
+
+
+async def _run_in_session(
+    query: Callable[[AsyncSession], Awaitable],
+    schema: type[BaseModel],
+) -> BaseModel:
+    """
+    Ejecutar una consulta del dashboard en su propia sesión (y conexión del pool).
+
+    Una AsyncSession no admite operaciones concurrentes, así que cada panel usa la suya
+    y se serializa antes de cerrarla.
+    """
+    session = AsyncSessionLocal()
+    try:
+        result = await query(session)
+        return schema.model_validate(result, from_attributes=True)
+    finally:
+        await session.close()
+
+
+@router.get("/summary", response_model=DashboardSummary)
+async def get_dashboard_summary(
+    recent_limit: int = Query(5, ge=1, le=50),
+    top_limit: int = Query(5, ge=1, le=50),
+    date_from: str | None = Query(None, description="Inicio del rango del top de productos (YYYY-MM-DD o ISO datetime)"),
+    date_to: str | None = Query(None, description="Fin del rango del top de productos (YYYY-MM-DD o ISO datetime)"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Resumen del dashboard en una sola petición: KPIs de hoy, ventas recientes,
+    top de productos y estadísticas de alertas.
+
+    Las cuatro consultas son independientes y se ejecutan en paralelo, cada una en su
+    propia conexión; el tiempo de respuesta queda cerca del de la consulta más lenta.
+    """
+    today, recent_sales, top_products, alerts = await asyncio.gather(
+        _run_in_session(
+            lambda db: sales.get_today_stats(db=db, current_user=current_user),
+            TodayStats,
+        ),
+        _run_in_session(
+            lambda db: sales.get_recent_sales(limit=recent_limit, db=db, current_user=current_user),
+            SaleList,
+        ),
+        _run_in_session(
+            lambda db: sales.get_top_products(
+                date_from=date_from, date_to=date_to, limit=top_limit, db=db, current_user=current_user
+            ),
+            TopProducts,
+        ),
+        _run_in_session(
+            lambda db: inventory_alerts.get_alert_statistics(db=db, current_user=current_user),
+            AlertStats,
+        ),
+    )
+    return DashboardSummary(
+        today=today,
+        recent_sales=recent_sales,
+        top_products=top_products,
+        alerts=alerts,
+    )
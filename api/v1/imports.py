@@ -5,6 +5,7 @@ from db.session import get_db
 from core.security import get_current_user
 from models.user import User
 from models.product import Product
+from services.catalog import record_product_changes
 import csv
 import io
 import tempfile
@@ -200,6 +201,7 @@ async def import_products(
     updated = 0
     failed = 0
     processed = 0
+    touched = []
     limit_rows = 200000
     for row in rows_iter:
         processed += 1
@@ -228,12 +230,15 @@ async def import_products(
             if nr.get('sku'):
                 prod.sku = nr['sku']
             updated += 1
+            touched.append(prod)
         else:
             new = Product(name=nr['name'], price=nr['price'], stock=nr['quantity'], sku=nr.get('sku'), category=nr.get('category') or 'General')
             db.add(new)
+            touched.append(new)
             inserted += 1
 
     await db.flush()
+    await record_product_changes(db, [prod.id for prod in touched])
 
     # Create audit log entry if model exists
     try:
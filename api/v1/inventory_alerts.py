@@ -11,7 +11,7 @@ from datetime import datetime, timedelta
 from db.session import get_db
 from models.inventory_alert import InventoryAlert
 from models.product import Product
-from models.sale import Sale
+from models.sale_item import SaleItem
 from schemas.inventory_alert import (
     InventoryAlert as InventoryAlertSchema,
     InventoryAlertCreate,
@@ -318,6 +318,13 @@ async def generate_alerts(
     # Obtener todos los productos
     result = await db.execute(select(Product))
     products = result.scalars().all()
+
+    # Productos con ventas dentro de la ventana de movimiento (una consulta indexada sobre sale_items)
+    cutoff_date = datetime.now() - timedelta(days=config.no_movement_days)
+    moved_result = await db.execute(
+        select(SaleItem.product_id).where(SaleItem.created_at >= cutoff_date).distinct()
+    )
+    moved_product_ids = set(moved_result.scalars().all())
     
     for product in products:
         # Desactivar TODAS las alertas antiguas del producto (de cualquier tipo)
@@ -380,18 +387,7 @@ async def generate_alerts(
             generated_alerts.append(f"Stock bajo: {product.name} ({product.stock})")
         
         # 4. Alerta de productos sin movimiento
-        # Verificar última venta del producto
-        cutoff_date = datetime.now() - timedelta(days=config.no_movement_days)
-        last_sale_result = await db.execute(
-            select(Sale)
-            .where(Sale.created_at >= cutoff_date)
-            .where(Sale.items.contains(f'"product_id": {product.id}'))
-            .order_by(Sale.created_at.desc())
-            .limit(1)
-        )
-        last_sale = last_sale_result.scalar_one_or_none()
-        
-        if not last_sale and product.stock > 0:
+        if product.id not in moved_product_ids and product.stock > 0:
             alert = InventoryAlert(
                 product_id=product.id,
                 alert_type="no_movement",
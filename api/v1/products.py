@@ -1,16 +1,30 @@
 """
 Endpoints de productos
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Header, Response, BackgroundTasks
+from fastapi.responses import FileResponse, RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, and_, or_
 from typing import List, Optional
-import os
-from datetime import datetime
+import gzip
 
 from db.session import get_db
 from models.product import Product
-from schemas.product import Product as ProductSchema, ProductCreate, ProductUpdate, ProductList
+from models.catalog import ProductTombstone
+from schemas.product import (
+    Product as ProductSchema, ProductCreate, ProductUpdate, ProductList,
+    ProductLookup, ProductLookupBatchRequest, ProductLookupBatch, ProductChanges,
+)
+from core.media import THUMBNAIL_SIZES, product_media_url, parse_variant_filename
+from services.inventory import resolve_stock_alerts
+from services.media import MAX_IMAGE_BYTES, store_product_image, gc_product_images, find_original
+from services.thumbnails import thumbnails_available, generate_thumbnails, ensure_thumbnail
+from services.product_search import search_products as search_index
+from services.product_cache import product_cache, cache_product
+from services.catalog_snapshot import get_catalog_snapshot, snapshot_etag, accepts_gzip
+from services.catalog import (
+    get_catalog_version, record_product_changes, encode_change_cursor, decode_change_cursor,
+)
 
 router = APIRouter()
 
@@ -22,7 +36,13 @@ async def get_products(
     category: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
-    """Obtener lista de productos"""
+    """Obtener lista de productos (servida desde la caché de catálogo si está vigente)"""
+    cache_key = ("list", skip, limit, category)
+    cached = product_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = product_cache.generation
+
     query = select(Product)
     
     if category:
@@ -41,7 +61,9 @@ async def get_products(
     result = await db.execute(query)
     products = result.scalars().all()
     
-    return {"items": products, "total": total}
+    response = ProductList(items=products, total=total)
+    product_cache.put(cache_key, response, generation)
+    return response
 
 
 @router.get("/search", response_model=ProductList)
@@ -52,33 +74,159 @@ async def search_products(
     limit: int = 50,
     db: AsyncSession = Depends(get_db)
 ):
-    """Buscar productos por nombre, SKU o código de barras"""
-    query = select(Product)
-    
-    if q:
-        search_term = f"%{q}%"
-        query = query.filter(
-            (Product.name.ilike(search_term)) |
-            (Product.sku.ilike(search_term)) |
-            (Product.barcode.ilike(search_term))
-        )
-    
-    if category:
-        query = query.filter(Product.category == category)
-    
-    if in_stock:
-        query = query.filter(Product.stock > 0)
-    
-    query = query.limit(limit)
-    result = await db.execute(query)
-    products = result.scalars().all()
+    """Buscar productos por nombre, SKU o código de barras (prefijos, ordenados por relevancia)"""
+    cache_key = ("search", q, category, in_stock, limit)
+    cached = product_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = product_cache.generation
+
+    products = await search_index(db, q, category=category, in_stock=in_stock, limit=limit)
     
-    return {"items": products, "total": len(products)}
+    response = ProductList(items=products, total=len(products))
+    product_cache.put(cache_key, response, generation)
+    return response
+
+
+async def _lookup_codes(db: AsyncSession, field: str, codes: list[str]) -> dict[str, ProductSchema]:
+    """Productos por coincidencia exacta de barcode o sku: primero la caché, el resto en una consulta (índice único)"""
+    found = {}
+    pending = []
+    for code in dict.fromkeys(codes):
+        cached = product_cache.get((field, code))
+        if cached is not None:
+            found[code] = cached
+        else:
+            pending.append(code)
+    if pending:
+        generation = product_cache.generation
+        column = getattr(Product, field)
+        result = await db.execute(select(Product).where(column.in_(pending)))
+        for product in result.scalars().all():
+            response = ProductSchema.model_validate(product)
+            cache_product(response, generation)
+            found[getattr(product, field)] = response
+    return found
+
+
+@router.get("/lookup", response_model=ProductLookup)
+async def lookup_product(
+    barcode: Optional[str] = None,
+    sku: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Buscar un producto escaneado por código de barras o SKU exacto (payload compacto)"""
+    if bool(barcode) == bool(sku):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Indique barcode o sku (solo uno)")
+    field, code = ("barcode", barcode) if barcode else ("sku", sku)
+    found = await _lookup_codes(db, field, [code])
+    if code not in found:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
+    return ProductLookup.model_validate(found[code])
+
+
+@router.post("/lookup/batch", response_model=ProductLookupBatch)
+async def lookup_products_batch(request: ProductLookupBatchRequest, db: AsyncSession = Depends(get_db)):
+    """Buscar varios códigos de barras y/o SKU exactos en una sola petición"""
+    by_barcode = await _lookup_codes(db, "barcode", request.barcodes)
+    by_sku = await _lookup_codes(db, "sku", request.skus)
+    items = {}
+    for product in [*by_barcode.values(), *by_sku.values()]:
+        items.setdefault(product.id, ProductLookup.model_validate(product))
+    return ProductLookupBatch(
+        items=list(items.values()),
+        missing_barcodes=[code for code in dict.fromkeys(request.barcodes) if code not in by_barcode],
+        missing_skus=[code for code in dict.fromkeys(request.skus) if code not in by_sku],
+    )
+
+
+@router.get("/changes", response_model=ProductChanges, response_model_exclude_none=True)
+async def get_product_changes(
+    since: Optional[str] = Query(None, description="Cursor devuelto por la petición anterior (vacío: todo el catálogo)"),
+    limit: int = Query(500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_db)
+):
+    """Productos creados, modificados o eliminados desde un cursor, en orden de versión del catálogo.
+
+    Se lee por el índice (change_seq, id) de products y por change_seq de product_tombstones.
+    Los eliminados llegan solo con id y deleted=true. Los cambios de stock por ventas no
+    incrementan la versión; el stock vigente se consulta con /products/lookup.
+    """
+    since_seq, since_id = decode_change_cursor(since) if since else (0, 0)
+    version = await get_catalog_version(db)
+
+    products = await db.execute(
+        select(Product)
+        .where(or_(Product.change_seq > since_seq, and_(Product.change_seq == since_seq, Product.id > since_id)))
+        .order_by(Product.change_seq, Product.id)
+        .limit(limit + 1)
+    )
+    tombstones = await db.execute(
+        select(ProductTombstone)
+        .where(or_(
+            ProductTombstone.change_seq > since_seq,
+            and_(ProductTombstone.change_seq == since_seq, ProductTombstone.product_id > since_id),
+        ))
+        .order_by(ProductTombstone.change_seq, ProductTombstone.product_id)
+        .limit(limit + 1)
+    )
+    changes = [(p.change_seq, p.id, p) for p in products.scalars().all()]
+    changes += [
+        (t.change_seq, t.product_id, {"id": t.product_id, "change_seq": t.change_seq, "deleted": True})
+        for t in tombstones.scalars().all()
+    ]
+    changes.sort(key=lambda change: change[:2])
+    page = changes[:limit]
+
+    next_cursor = encode_change_cursor(*page[-1][:2]) if page else (since or encode_change_cursor(0, 0))
+    return {
+        "items": [change[2] for change in page],
+        "next_cursor": next_cursor,
+        "has_more": len(changes) > limit,
+        "version": version,
+    }
+
+
+@router.get("/snapshot")
+async def get_products_snapshot(
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """Catálogo completo en un solo JSON comprimido (gzip) con ETag por versión del catálogo.
+
+    Responde 304 si If-None-Match coincide con la versión actual. El JSON trae `cursor`
+    para seguir sincronizando con GET /products/changes?since=cursor.
+    """
+    version = await get_catalog_version(db)
+    etag = snapshot_etag(version)
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    snapshot = await get_catalog_snapshot(db, version)
+    headers = {"ETag": snapshot["etag"], "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    body = snapshot["body"]
+    if accepts_gzip(accept_encoding):
+        headers["Content-Encoding"] = "gzip"
+    else:
+        body = gzip.decompress(body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/cache/stats")
+async def get_product_cache_stats():
+    """Contadores de la caché de catálogo (aciertos, fallos, tamaño, invalidaciones)"""
+    return product_cache.stats()
 
 
 @router.get("/{product_id}", response_model=ProductSchema)
 async def get_product(product_id: int, db: AsyncSession = Depends(get_db)):
     """Obtener un producto por ID"""
+    cached = product_cache.get(("id", product_id))
+    if cached is not None:
+        return cached
+    generation = product_cache.generation
+
     result = await db.execute(select(Product).filter(Product.id == product_id))
     product = result.scalar_one_or_none()
     
@@ -88,7 +236,9 @@ async def get_product(product_id: int, db: AsyncSession = Depends(get_db)):
             detail="Producto no encontrado"
         )
     
-    return product
+    response = ProductSchema.model_validate(product)
+    cache_product(response, generation)
+    return response
 
 
 @router.post("/", response_model=ProductSchema, status_code=status.HTTP_201_CREATED)
@@ -118,6 +268,7 @@ async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_
     db.add(db_product)
     await db.flush()
     await db.refresh(db_product)
+    await record_product_changes(db, [db_product.id])
     
     return db_product
 
@@ -165,34 +316,12 @@ async def update_product(
         setattr(db_product, field, value)
     
     await db.flush()
+    await record_product_changes(db, [product_id])
     
     # Resolver alertas automáticamente si el stock mejoró
     new_stock = db_product.stock
     if "stock" in update_data and new_stock > old_stock:
-        # Importar modelo de alertas
-        from models.inventory_alert import InventoryAlert
-        
-        # Buscar alertas activas de este producto relacionadas con stock
-        alerts_query = select(InventoryAlert).where(
-            InventoryAlert.product_id == product_id,
-            InventoryAlert.is_active == True,
-            InventoryAlert.alert_type.in_(['low_stock', 'no_stock'])
-        )
-        result = await db.execute(alerts_query)
-        active_alerts = result.scalars().all()
-        
-        # Resolver alertas si el stock ahora es suficiente
-        for alert in active_alerts:
-            # Si es alerta de "sin stock" y ahora hay stock
-            if alert.alert_type == 'no_stock' and new_stock > 0:
-                alert.is_active = False
-                alert.resolved_at = datetime.utcnow()
-            
-            # Si es alerta de "stock bajo" y ahora está por encima del umbral
-            elif alert.alert_type == 'low_stock' and alert.threshold:
-                if new_stock > alert.threshold:
-                    alert.is_active = False
-                    alert.resolved_at = datetime.utcnow()
+        await resolve_stock_alerts(db, [product_id])
     
     await db.refresh(db_product)
     
@@ -200,7 +329,7 @@ async def update_product(
 
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)):
+async def delete_product(product_id: int, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
     """Eliminar un producto"""
     result = await db.execute(select(Product).filter(Product.id == product_id))
     db_product = result.scalar_one_or_none()
@@ -212,6 +341,8 @@ async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)):
         )
     
     await db.delete(db_product)
+    await record_product_changes(db, [product_id], deleted=True)
+    background_tasks.add_task(gc_product_images, product_id)
     
     return None
 
@@ -219,10 +350,20 @@ async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)):
 @router.post("/{product_id}/image", response_model=ProductSchema)
 async def upload_product_image(
     product_id: int,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    content_length: Optional[int] = Header(None),
     db: AsyncSession = Depends(get_db)
 ):
-    """Subir imagen para un producto y actualizar su image_url"""
+    """Subir imagen para un producto y actualizar su image_url
+
+    La imagen se guarda por bloques como media/products/<id>/<sha256>.<ext>. Después del commit,
+    en segundo plano, se generan sus miniaturas WebP y se borran las imágenes anteriores del producto.
+    """
+    # Rechazar antes de leer el cuerpo si el tamaño declarado ya excede el límite (+ encabezados multipart)
+    if content_length is not None and content_length > MAX_IMAGE_BYTES + 64 * 1024:
+        raise HTTPException(status_code=400, detail="La imagen excede 5MB")
+
     # Validar producto
     result = await db.execute(select(Product).filter(Product.id == product_id))
     db_product = result.scalar_one_or_none()
@@ -235,21 +376,37 @@ async def upload_product_image(
     if not ext:
         raise HTTPException(status_code=400, detail="Tipo de imagen no soportado. Usa JPG, PNG o WEBP")
 
-    # Guardar archivo
-    media_root = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'media')
-    product_dir = os.path.join(media_root, 'products', str(product_id))
-    os.makedirs(product_dir, exist_ok=True)
-    fname = datetime.utcnow().strftime("%Y%m%d%H%M%S%f") + ext
-    path = os.path.join(product_dir, fname)
-    content = await file.read()
-    if len(content) > 5 * 1024 * 1024:  # 5 MB
-        raise HTTPException(status_code=400, detail="La imagen excede 5MB")
-    with open(path, 'wb') as f:
-        f.write(content)
+    # Guardar archivo (nombre por contenido: la misma imagen no se vuelve a escribir)
+    fname = await store_product_image(product_id, file, ext)
 
     # Actualizar URL (ruta relativa servida por /media)
-    rel_url = f"/media/products/{product_id}/{fname}"
+    rel_url = product_media_url(product_id, fname)
+    if db_product.image_url == rel_url:
+        return db_product
     db_product.image_url = rel_url
     await db.flush()
+    await record_product_changes(db, [product_id])
     await db.refresh(db_product)
+    background_tasks.add_task(generate_thumbnails, product_id, fname)
+    background_tasks.add_task(gc_product_images, product_id)
     return db_product
+
+
+@router.get("/{product_id}/thumbnails/{filename}")
+async def get_product_thumbnail(product_id: int, filename: str):
+    """Miniatura WebP de la imagen de un producto (<sha256>_<px>.webp); si falta se genera en el momento
+
+    El nombre depende del contenido de la imagen, así que la respuesta se puede cachear indefinidamente.
+    """
+    parsed = parse_variant_filename(filename)
+    original = find_original(product_id, parsed[0]) if parsed and parsed[1] in THUMBNAIL_SIZES else None
+    if original is None:
+        raise HTTPException(status_code=404, detail="Imagen no encontrada")
+    if not thumbnails_available():
+        return RedirectResponse(product_media_url(product_id, original))
+    try:
+        path = await ensure_thumbnail(product_id, original, parsed[1])
+    except Exception:
+        # Imagen dañada o formato no soportado por Pillow: servir la original
+        return RedirectResponse(product_media_url(product_id, original))
+    return FileResponse(path, media_type="image/webp", headers={"Cache-Control": "public, max-age=31536000, immutable"})
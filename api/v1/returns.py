@@ -1,14 +1,11 @@
 """
 API de Devoluciones
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
-from datetime import datetime, timedelta, date, time
+from datetime import datetime, timedelta
 from typing import List
-import csv
-import io
-from fastapi.responses import StreamingResponse
 
 from db.session import get_db
 from core.security import get_current_user
@@ -19,31 +16,16 @@ from models.returns import Return as ReturnModel
 from models.audit_log import AuditLog
 from models.user import User
 from schemas.returns import Return as ReturnSchema, ReturnCreate, ReturnList, ReturnValidation
+from services.rollups import record_refund, record_product_lines
+from services.sales import get_sale_lines, returned_quantities, apply_return
+from services.idempotency import request_fingerprint, replay_response, save_response
+from services.dates import parse_date_range, range_filters
+from services.exports import export_response
+from services.product_cache import invalidate_products
 
 router = APIRouter()
 
 
-def _parse_date_range(date_from: str | None, date_to: str | None):
-    start_dt = None
-    end_dt = None
-    try:
-        if date_from:
-            if len(date_from) <= 10:
-                d = date.fromisoformat(date_from)
-                start_dt = datetime.combine(d, time.min)
-            else:
-                start_dt = datetime.fromisoformat(date_from)
-        if date_to:
-            if len(date_to) <= 10:
-                d = date.fromisoformat(date_to)
-                end_dt = datetime.combine(d, time.max)
-            else:
-                end_dt = datetime.fromisoformat(date_to)
-    except Exception:
-        pass
-    return start_dt, end_dt
-
-
 @router.get("/validate", response_model=ReturnValidation)
 async def validate_return(
     sale_id: int = Query(..., description="ID de venta"),
@@ -74,12 +56,20 @@ async def validate_return(
 @router.post("/", response_model=ReturnSchema, status_code=status.HTTP_201_CREATED)
 async def create_return(
     payload: ReturnCreate,
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=100),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Crea una devolución con reglas: valida ventana, estado, calcula montos, ajusta stock atómicamente y registra comprobante."""
-    # Obtener venta
-    result = await db.execute(select(Sale).where(Sale.id == payload.sale_id))
+    # Reintento de una devolución ya registrada: regresar la respuesta original
+    if idempotency_key:
+        request_hash = request_fingerprint(payload)
+        replay = await replay_response(db, "returns:create", idempotency_key, current_user.id, request_hash)
+        if replay is not None:
+            return replay
+
+    # Obtener venta bloqueando su fila: serializa devoluciones simultáneas de la misma venta
+    result = await db.execute(select(Sale).where(Sale.id == payload.sale_id).with_for_update())
     sale = result.scalar_one_or_none()
     if not sale:
         raise HTTPException(status_code=404, detail="Venta no encontrada")
@@ -93,33 +83,11 @@ async def create_return(
     if sale.status != "completed":
         raise HTTPException(status_code=400, detail="Estado de venta no permite devolución")
 
-    # Mapear items de la venta por product_id para validar cantidades y precios
-    sale_items = {}
-    try:
-        for it in sale.items or []:
-            if isinstance(it, dict):
-                pid = int(it.get("product_id"))
-                sale_items[pid] = {
-                    "name": it.get("product_name"),
-                    "quantity": int(it.get("quantity", 0)),
-                    "unit_price": float(it.get("unit_price", 0)),
-                    "subtotal": float(it.get("subtotal", 0)),
-                }
-    except Exception:
-        raise HTTPException(status_code=400, detail="Formato de items en venta inválido")
+    # Mapear líneas de la venta (sale_items) por product_id para validar cantidades y precios
+    sale_items = await get_sale_lines(db, sale.id)
 
-    # Obtener devoluciones previas de esta venta para no exceder vendido
-    prev_res = await db.execute(select(ReturnModel).where(ReturnModel.sale_id == sale.id))
-    prev_returns = prev_res.scalars().all()
-    prev_by_pid: dict[int, int] = {}
-    for r in prev_returns:
-        try:
-            for it in (r.items_returned or []):
-                if isinstance(it, dict):
-                    pid = int(it.get("product_id"))
-                    prev_by_pid[pid] = prev_by_pid.get(pid, 0) + int(it.get("quantity", 0))
-        except Exception:
-            pass
+    # Cantidades ya devueltas de esta venta (acumulado en la propia venta) para no exceder vendido
+    prev_by_pid = returned_quantities(sale)
 
     # Validar items a devolver no exceden vendidos y calcular montos
     subtotal_ref = 0.0
@@ -182,6 +150,9 @@ async def create_return(
                 raise HTTPException(status_code=400, detail=f"Stock insuficiente para intercambio de {prod.name}")
             prod.stock -= int(eit.quantity)
 
+    invalidate_products(db, [rit.product_id for rit in payload.items_returned]
+                        + [eit.product_id for eit in payload.items_exchanged or []])
+
     # Crear devolución
     db_return = ReturnModel(
         sale_id=sale.id,
@@ -195,6 +166,7 @@ async def create_return(
         refund_method=refund_method,
         reason=payload.reason or None,
         status="completed",
+        created_at=datetime.utcnow(),
     )
     db.add(db_return)
 
@@ -203,6 +175,26 @@ async def create_return(
     await db.flush()
     await db.refresh(db_return)
 
+    # Acumular la devolución en la venta (misma transacción, fila bloqueada)
+    returned_now: dict[int, int] = {}
+    for rit in payload.items_returned:
+        returned_now[rit.product_id] = returned_now.get(rit.product_id, 0) + int(rit.quantity)
+    apply_return(sale, returned_now, total_ref)
+    await db.flush()
+
+    # Descontar las unidades devueltas del acumulado por producto (día de la venta)
+    await record_product_lines(db, sale, {
+        pid: {
+            "name": sale_items[pid]["name"],
+            "quantity": qty,
+            "subtotal": sale_items[pid]["unit_price"] * qty,
+        }
+        for pid, qty in returned_now.items()
+    }, sign=-1)
+
+    # Descontar el reembolso del ingreso neto del día de la venta
+    await record_refund(db, sale, total_ref)
+
     # Registrar auditoría
     try:
         detail = f"ReturnID={db_return.id}, SaleID={sale.id}, action={action}, total_refund={total_ref}"
@@ -211,9 +203,81 @@ async def create_return(
         # No bloquear por error de auditoría
         pass
 
+    if idempotency_key:
+        await save_response(
+            db, "returns:create", idempotency_key, current_user.id, request_hash,
+            status.HTTP_201_CREATED, ReturnSchema.model_validate(db_return),
+        )
+
     return db_return
 
 
+@router.get("/export")
+async def export_returns(
+    sale_id: int | None = Query(None),
+    date_from: str | None = Query(None, description="YYYY-MM-DD o ISO datetime"),
+    date_to: str | None = Query(None, description="YYYY-MM-DD o ISO datetime"),
+    action: str | None = Query(None),
+    refund_method: str | None = Query(None),
+    status_param: str | None = Query(None, alias="status"),
+    export_format: str = Query("csv", alias="format", description="csv|xlsx|ndjson"),
+    current_user: User = Depends(get_current_user)
+):
+    """Exporta devoluciones en CSV, XLSX o NDJSON leyendo por bloques con un cursor del servidor."""
+    filters = range_filters(ReturnModel.created_at, *parse_date_range(date_from, date_to))
+    if sale_id is not None:
+        filters.append(ReturnModel.sale_id == sale_id)
+    if action:
+        filters.append(ReturnModel.action == action)
+    if refund_method:
+        filters.append(ReturnModel.refund_method == refund_method)
+    if status_param:
+        filters.append(ReturnModel.status == status_param)
+
+    stmt = (
+        select(
+            ReturnModel.id,
+            ReturnModel.sale_id,
+            ReturnModel.created_at,
+            ReturnModel.action,
+            ReturnModel.refund_method,
+            ReturnModel.subtotal_refund,
+            ReturnModel.tax_refund,
+            ReturnModel.total_refund,
+            ReturnModel.status,
+            ReturnModel.items_returned,
+        )
+        .where(*filters)
+        .order_by(ReturnModel.created_at.desc())
+    )
+
+    def to_row(r):
+        items_count = 0
+        try:
+            for it in (r.items_returned or []):
+                if isinstance(it, dict):
+                    items_count += int(it.get('quantity') or 0)
+        except Exception:
+            pass
+        return [
+            r.id,
+            r.sale_id,
+            r.created_at,
+            r.action,
+            r.refund_method or '',
+            round(float(r.subtotal_refund), 2),
+            round(float(r.tax_refund), 2),
+            round(float(r.total_refund), 2),
+            r.status,
+            items_count,
+        ]
+
+    header = [
+        'id', 'sale_id', 'created_at', 'action', 'refund_method', 'subtotal_refund', 'tax_refund', 'total_refund', 'status', 'items_returned_count'
+    ]
+    return export_response(export_format, "returns_export", header, stmt, to_row)
+
+
 @router.get("/{return_id}", response_model=ReturnSchema)
 async def get_return(
     return_id: int,
@@ -240,14 +304,9 @@ async def list_returns(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    start_dt, end_dt = _parse_date_range(date_from, date_to)
-    filters = []
+    filters = range_filters(ReturnModel.created_at, *parse_date_range(date_from, date_to))
     if sale_id is not None:
         filters.append(ReturnModel.sale_id == sale_id)
-    if start_dt is not None:
-        filters.append(ReturnModel.created_at >= start_dt)
-    if end_dt is not None:
-        filters.append(ReturnModel.created_at <= end_dt)
     if action:
         filters.append(ReturnModel.action == action)
     if refund_method:
@@ -269,67 +328,3 @@ async def list_returns(
     res = await db.execute(stmt)
     items = res.scalars().all()
     return {"items": items, "total": total}
-
-
-@router.get("/export")
-async def export_returns_csv(
-    sale_id: int | None = Query(None),
-    date_from: str | None = Query(None, description="YYYY-MM-DD o ISO datetime"),
-    date_to: str | None = Query(None, description="YYYY-MM-DD o ISO datetime"),
-    action: str | None = Query(None),
-    refund_method: str | None = Query(None),
-    status_param: str | None = Query(None, alias="status"),
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    start_dt, end_dt = _parse_date_range(date_from, date_to)
-    filters = []
-    if sale_id is not None:
-        filters.append(ReturnModel.sale_id == sale_id)
-    if start_dt is not None:
-        filters.append(ReturnModel.created_at >= start_dt)
-    if end_dt is not None:
-        filters.append(ReturnModel.created_at <= end_dt)
-    if action:
-        filters.append(ReturnModel.action == action)
-    if refund_method:
-        filters.append(ReturnModel.refund_method == refund_method)
-    if status_param:
-        filters.append(ReturnModel.status == status_param)
-
-    res = await db.execute(select(ReturnModel).where(*filters).order_by(ReturnModel.created_at.desc()))
-    items = res.scalars().all()
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow([
-        'id', 'sale_id', 'created_at', 'action', 'refund_method', 'subtotal_refund', 'tax_refund', 'total_refund', 'status', 'items_returned_count'
-    ])
-    for r in items:
-        items_count = 0
-        try:
-            for it in (r.items_returned or []):
-                if isinstance(it, dict):
-                    items_count += int(it.get('quantity') or 0)
-        except Exception:
-            pass
-        writer.writerow([
-            r.id,
-            r.sale_id,
-            r.created_at.isoformat() if getattr(r, 'created_at', None) else '',
-            r.action,
-            r.refund_method or '',
-            f"{r.subtotal_refund:.2f}",
-            f"{r.tax_refund:.2f}",
-            f"{r.total_refund:.2f}",
-            r.status,
-            items_count,
-        ])
-
-    output.seek(0)
-    filename = f"returns_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    return StreamingResponse(
-        iter([output.getvalue().encode('utf-8-sig')]),
-        media_type='text/csv',
-        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
-    )
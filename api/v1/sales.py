@@ -1,126 +1,256 @@
 """
 Endpoints de ventas
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, delete, and_, or_
 from typing import List
-from datetime import datetime, date, time
-import csv
-import io
-from fastapi.responses import StreamingResponse
+from datetime import datetime, timedelta
+import base64
+import json
 
 from db.session import get_db
 from models.sale import Sale
+from models.sale_item import SaleItem
 from models.product import Product
+from models.returns import Return
 from models.user import User
-from schemas.sale import Sale as SaleSchema, SaleCreate, SaleUpdate, SaleList, TodayStats, TopProducts, TopProduct
-from models.returns import Return as ReturnModel
+from schemas.sale import (
+    Sale as SaleSchema, SaleCreate, SaleUpdate, SaleList, SaleSummaryList, TodayStats, TopProducts, TopProduct, SalesTimeseries,
+    RegisterClose,
+    SaleBatchCreate, SaleBatchResult, SaleBatchResponse,
+)
 from core.security import get_current_user
+from core.config import settings
+from services.sales import (
+    attach_net_totals, record_sale_items, returned_line_totals,
+    aggregate_quantities, load_stock, decrement_stock, increment_stock,
+)
+from services.exports import export_response
+from services.dates import (
+    PERIODS, day_window, parse_date_range, parse_day_range, period_days, range_filters,
+)
+from services.timeseries import BUCKETS, MAX_POINTS, slot_plan, utc_slot_key, count_buckets, fold_slots
+from services.idempotency import request_fingerprint, replay_response, save_response
+from services.rollups import (
+    record_sale, record_sales, record_status_change, get_rollup_totals,
+    record_product_sales, get_rollup_top_products,
+)
+from services.inventory import restore_sale_inventory, reapply_sale_inventory
 
 router = APIRouter()
 
 
-def _parse_date_range(date_from: str | None, date_to: str | None):
-    start_dt = None
-    end_dt = None
+def _sale_filters(
+    date_from: str | None,
+    date_to: str | None,
+    sale_id: int | None,
+    payment_method: str | None,
+    status_param: str | None,
+    product_id: int | None = None,
+    sku: str | None = None,
+) -> list:
+    """Filtros comunes del listado y la exportación de ventas.
+
+    Los filtros por producto/SKU se resuelven con un IN sobre sale_items, que usa el índice
+    (product_id, created_at) con el mismo rango de fechas en lugar de revisar el JSON de items.
+    """
+    start_dt, end_dt = parse_date_range(date_from, date_to)
+    filters = range_filters(Sale.created_at, start_dt, end_dt)
+    if payment_method:
+        filters.append(Sale.payment_method == payment_method)
+    if status_param:
+        filters.append(Sale.status == status_param)
+    if sale_id is not None:
+        filters.append(Sale.id == sale_id)
+    if product_id is not None or sku:
+        line_filters = range_filters(SaleItem.created_at, start_dt, end_dt)
+        if product_id is not None:
+            line_filters.append(SaleItem.product_id == product_id)
+        if sku:
+            line_filters.append(SaleItem.product_id.in_(select(Product.id).where(Product.sku == sku)))
+        filters.append(Sale.id.in_(select(SaleItem.sale_id).where(*line_filters)))
+    return filters
+
+
+def _encode_cursor(sale: Sale) -> str:
+    """Cursor opaco (base64) con la llave de orden (created_at, id) de la última venta de la página"""
+    payload = json.dumps({"c": sale.created_at.isoformat() if sale.created_at else None, "i": sale.id})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
     try:
-        if date_from:
-            # Accept YYYY-MM-DD or ISO datetime
-            if len(date_from) <= 10:
-                d = date.fromisoformat(date_from)
-                start_dt = datetime.combine(d, time.min)
-            else:
-                start_dt = datetime.fromisoformat(date_from)
-        if date_to:
-            if len(date_to) <= 10:
-                d = date.fromisoformat(date_to)
-                end_dt = datetime.combine(d, time.max)
-            else:
-                end_dt = datetime.fromisoformat(date_to)
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(payload["c"]), int(payload["i"])
     except Exception:
-        # Ignore parsing errors; leave None
-        pass
-    return start_dt, end_dt
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor inválido"
+        )
+
+
+def _items_count():
+    """Unidades de la venta como subconsulta correlacionada sobre sale_items (índice por sale_id)"""
+    return (
+        select(func.coalesce(func.sum(SaleItem.quantity), 0))
+        .where(SaleItem.sale_id == Sale.id)
+        .correlate(Sale)
+        .scalar_subquery()
+    )
+
+
+def _paginate(query, cursor: str | None, skip: int, limit: int):
+    """Ordenar por (created_at, id) descendente y paginar por cursor (llave) o por offset"""
+    query = query.order_by(Sale.created_at.desc(), Sale.id.desc())
+    if cursor:
+        cursor_created_at, cursor_id = _decode_cursor(cursor)
+        query = query.where(
+            or_(
+                Sale.created_at < cursor_created_at,
+                and_(Sale.created_at == cursor_created_at, Sale.id < cursor_id),
+            )
+        )
+    else:
+        query = query.offset(skip)
+    return query.limit(limit)
 
 
 @router.get("/", response_model=SaleList)# Obtener lista de ventas
 async def get_sales(
     skip: int = 0,
     limit: int = 100,
+    cursor: str | None = Query(None, description="Cursor de next_cursor; reemplaza a skip (paginación por llave)"),
+    include_total: bool = Query(True, description="Calcular el total de registros (COUNT)"),
     date_from: str | None = Query(None, description="YYYY-MM-DD o ISO datetime"),
     date_to: str | None = Query(None, description="YYYY-MM-DD o ISO datetime"),
     sale_id: int | None = Query(None, description="Filtrar por ID de venta"),
     payment_method: str | None = None,
     status_param: str | None = Query(None, alias="status"),
+    product_id: int | None = Query(None, description="Solo ventas que incluyen este producto"),
+    sku: str | None = Query(None, description="Solo ventas que incluyen el producto con este SKU"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Obtener lista de ventas"""
-    filters = []
-    start_dt, end_dt = _parse_date_range(date_from, date_to)
-    if start_dt is not None:
-        filters.append(Sale.created_at >= start_dt)
-    if end_dt is not None:
-        filters.append(Sale.created_at <= end_dt)
-    if payment_method:
-        filters.append(Sale.payment_method == payment_method)
-    if status_param:
-        filters.append(Sale.status == status_param)
-    if sale_id is not None:
-        filters.append(Sale.id == sale_id)
+    """Obtener lista de ventas
+
+    Con `cursor` la página se resuelve por llave (created_at, id) sobre el índice
+    ix_sales_created_at_id, con costo constante sin importar la profundidad.
+    """
+    filters = _sale_filters(date_from, date_to, sale_id, payment_method, status_param, product_id, sku)
 
     # total count
-    total_result = await db.execute(select(func.count()).select_from(Sale).where(*filters))
-    total = int(total_result.scalar() or 0)
+    total = None
+    if include_total:
+        total_result = await db.execute(select(func.count()).select_from(Sale).where(*filters))
+        total = int(total_result.scalar() or 0)
 
-    result = await db.execute(
-        select(Sale)
-        .where(*filters)
-        .order_by(Sale.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-    )
+    query = _paginate(select(Sale).where(*filters), cursor, skip, limit)
+    result = await db.execute(query)
     sales = result.scalars().all()
-    # Compute net_total per sale (total - sum(total_refund) for completed returns)
-    items_with_net = []
-    for s in sales:
-        ret_res = await db.execute(select(func.coalesce(func.sum(ReturnModel.total_refund), 0.0)).where(ReturnModel.sale_id == s.id, ReturnModel.status == 'completed'))
-        total_ref = float(ret_res.scalar() or 0.0)
-        # attach dynamic attribute for serialization via from_attributes
-        setattr(s, 'net_total', float(s.total) - total_ref)
-        items_with_net.append(s)
-    
-    return {"items": items_with_net, "total": total}
+    # net_total de la página desde la columna refunded_total (sin consultar devoluciones)
+    attach_net_totals(sales)
+
+    next_cursor = _encode_cursor(sales[-1]) if sales and len(sales) == limit else None
+    return {"items": sales, "total": total, "next_cursor": next_cursor}
+
+
+@router.get("/summary", response_model=SaleSummaryList)
+async def get_sales_summary(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = Query(None, description="Cursor de next_cursor; reemplaza a skip (paginación por llave)"),
+    include_total: bool = Query(True, description="Calcular el total de registros (COUNT)"),
+    date_from: str | None = Query(None, description="YYYY-MM-DD o ISO datetime"),
+    date_to: str | None = Query(None, description="YYYY-MM-DD o ISO datetime"),
+    sale_id: int | None = Query(None, description="Filtrar por ID de venta"),
+    payment_method: str | None = None,
+    status_param: str | None = Query(None, alias="status"),
+    product_id: int | None = Query(None, description="Solo ventas que incluyen este producto"),
+    sku: str | None = Query(None, description="Solo ventas que incluyen el producto con este SKU"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Listado de ventas sin líneas de detalle (para grids).
+
+    Mismos filtros y paginación que GET /sales/, pero solo columnas escalares y el número de
+    unidades (sumado de sale_items); la columna JSON items no se lee.
+    """
+    filters = _sale_filters(date_from, date_to, sale_id, payment_method, status_param, product_id, sku)
+
+    total = None
+    if include_total:
+        total_result = await db.execute(select(func.count()).select_from(Sale).where(*filters))
+        total = int(total_result.scalar() or 0)
+
+    query = select(
+        Sale.id,
+        Sale.user_id,
+        Sale.customer_id,
+        Sale.payment_method,
+        Sale.status,
+        Sale.subtotal,
+        Sale.tax,
+        Sale.discount,
+        Sale.total,
+        Sale.refunded_total,
+        (Sale.total - Sale.refunded_total).label('net_total'),
+        _items_count().label('items_count'),
+        Sale.created_at,
+        Sale.updated_at,
+    ).where(*filters)
+    result = await db.execute(_paginate(query, cursor, skip, limit))
+    rows = result.all()
+
+    next_cursor = _encode_cursor(rows[-1]) if rows and len(rows) == limit else None
+    return {"items": [row._mapping for row in rows], "total": total, "next_cursor": next_cursor}
 
 
 
 @router.post("/", response_model=SaleSchema, status_code=status.HTTP_201_CREATED)#Crear venta
 async def create_sale(
     sale: SaleCreate, 
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=100),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Crear una nueva venta y descontar del inventario"""
-    # Verificar stock de productos y recopilar productos
-    products_to_update = []
-    for item in sale.items:
-        result = await db.execute(select(Product).filter(Product.id == item.product_id))
-        product = result.scalar_one_or_none()
+    """Crear una nueva venta y descontar del inventario
+
+    Con el header Idempotency-Key, un reintento de la misma petición regresa la respuesta
+    original sin volver a tocar productos ni stock.
+    """
+    if idempotency_key:
+        request_hash = request_fingerprint(sale)
+        replay = await replay_response(db, "sales:create", idempotency_key, current_user.id, request_hash)
+        if replay is not None:
+            return replay
+
+    # Verificar stock de todos los productos del ticket con una sola consulta
+    quantities = aggregate_quantities(sale.items)
+    products = await load_stock(db, quantities)
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
         
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Producto {item.product_id} no encontrado"
+                detail=f"Producto {product_id} no encontrado"
             )
         
-        if product.stock < item.quantity:
+        if product.stock < quantity:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Stock insuficiente para {product.name}. Disponible: {product.stock}, Solicitado: {item.quantity}"
+                detail=f"Stock insuficiente para {product.name}. Disponible: {product.stock}, Solicitado: {quantity}"
             )
-        
-        products_to_update.append((product, item.quantity))
+    
+    # Descontar stock con UPDATE condicionales; si otra venta ganó la última unidad, se revierte todo
+    failed = await decrement_stock(db, quantities)
+    if failed:
+        product = products[failed[0]]
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Stock insuficiente para {product.name}. Solicitado: {quantities[failed[0]]}"
+        )
     
     # Crear venta
     sale_data = sale.model_dump()
@@ -128,113 +258,348 @@ async def create_sale(
     sale_data["items"] = [item.model_dump() for item in sale.items]
     sale_data["user_id"] = current_user.id
     sale_data["customer_id"] = None  # Customers deprecated
+    # UTC explícito (como el lote): func.now() usaría la zona de la sesión en MySQL
+    sale_data["created_at"] = datetime.utcnow()
     
     db_sale = Sale(**sale_data)
     db.add(db_sale)
     
-    # Actualizar stock de productos
-    for product, quantity in products_to_update:
-        product.stock -= quantity
-    
     await db.flush()
     await db.refresh(db_sale)
+    await record_sale_items(db, db_sale)
+    await record_sale(db, db_sale)
+    await record_product_sales(db, [db_sale])
+
+    if idempotency_key:
+        await save_response(
+            db, "sales:create", idempotency_key, current_user.id, request_hash,
+            status.HTTP_201_CREATED, SaleSchema.model_validate(db_sale),
+        )
     
     return db_sale
 
 
-@router.get("/stats/today", response_model=TodayStats)
-async def get_today_stats(
+# Reintentos del lote si otra venta consume stock entre la lectura y el UPDATE condicional
+BATCH_STOCK_ATTEMPTS = 3
+
+
+def _allocate_batch(tickets: List[SaleCreate], products: dict):
+    """Asignar en memoria el stock leído a los tickets, en orden; regresa (resultados, aceptados)"""
+    remaining = {pid: row.stock for pid, row in products.items()}
+    results: list[SaleBatchResult] = []
+    accepted: list[tuple[int, dict[int, int]]] = []
+    for index, ticket in enumerate(tickets):
+        quantities = aggregate_quantities(ticket.items)
+        error = None
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if not product:
+                error = f"Producto {product_id} no encontrado"
+                break
+            if remaining[product_id] < quantity:
+                error = f"Stock insuficiente para {product.name}. Disponible: {remaining[product_id]}, Solicitado: {quantity}"
+                break
+        if error:
+            results.append(SaleBatchResult(index=index, ok=False, error=error))
+            continue
+        for product_id, quantity in quantities.items():
+            remaining[product_id] -= quantity
+        accepted.append((index, quantities))
+        results.append(SaleBatchResult(index=index, ok=True))
+    return results, accepted
+
+
+@router.post("/batch", response_model=SaleBatchResponse)
+async def create_sales_batch(
+    batch: SaleBatchCreate,
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=100),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """KPIs de hoy: ingresos totales, productos vendidos y clientes atendidos (distintos)."""
-    # Determinar el inicio del día en la zona del servidor (asumimos UTC o tz de DB)
-    # Usamos DATE(created_at) = CURRENT_DATE para MySQL
-    # Obtener todas las ventas de hoy
-    result = await db.execute(
-        select(Sale).where(func.date(Sale.created_at) == func.current_date())
-    )
-    sales_today = result.scalars().all()
-
-    # Calculate revenue using net totals (subtracting refunds)
-    revenue_today = 0.0
-    if sales_today:
-        for s in sales_today:
-            ret_res = await db.execute(select(func.coalesce(func.sum(ReturnModel.total_refund), 0.0)).where(ReturnModel.sale_id == s.id, ReturnModel.status == 'completed'))
-            total_ref = float(ret_res.scalar() or 0.0)
-            revenue_today += float(s.total) - total_ref
-    # Contar productos vendidos sumando quantities en items JSON
-    products_sold_today = 0
-    customers_set = set()
-    for s in sales_today:
-        try:
-            items = s.items or []
-            for it in items:
-                # it puede ser dict con 'quantity'
-                qty = it.get('quantity', 0) if isinstance(it, dict) else 0
-                products_sold_today += int(qty or 0)
-        except Exception:
-            # Si items no es iterable, ignorar
-            pass
-        if s.customer_id:
-            customers_set.add(s.customer_id)
-
-    # Si no hay customer_id registrados (funcionalidad de clientes desactivada), usamos # de tickets
-    customers_today = len(customers_set) if len(customers_set) > 0 else len(sales_today)
+    """Registrar un lote de ventas (tickets de cajas que estuvieron sin conexión).
+
+    Valida el stock de todos los tickets con una sola lectura de productos, descuenta
+    inventario con un UPDATE condicional por producto e inserta ventas y líneas en bloque.
+    Cada ticket se acepta o rechaza por separado; la respuesta trae el resultado de cada uno.
+
+    Sin Idempotency-Key, reenviar un lote cuya respuesta se perdió (p. ej. por timeout)
+    registra de nuevo todos sus tickets. Con el header, el reintento regresa la respuesta
+    original sin volver a registrar ventas.
+    """
+    if idempotency_key:
+        request_hash = request_fingerprint(batch)
+        replay = await replay_response(db, "sales:batch", idempotency_key, current_user.id, request_hash)
+        if replay is not None:
+            return replay
+
+    product_ids = {item.product_id for ticket in batch.sales for item in ticket.items}
+    for _ in range(BATCH_STOCK_ATTEMPTS):
+        products = await load_stock(db, product_ids)
+        results, accepted = _allocate_batch(batch.sales, products)
+        totals: dict[int, int] = {}
+        for _, quantities in accepted:
+            for product_id, quantity in quantities.items():
+                totals[product_id] = totals.get(product_id, 0) + quantity
+        failed = await decrement_stock(db, totals)
+        if not failed:
+            break
+        # Otra venta consumió stock entre la lectura y el UPDATE: revertir lo descontado y reasignar
+        await increment_stock(db, {pid: q for pid, q in totals.items() if pid not in failed})
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="El inventario cambió mientras se registraba el lote; intente de nuevo"
+        )
+
+    created_at = datetime.utcnow()
+    db_sales = []
+    for index, _ in accepted:
+        ticket = batch.sales[index]
+        sale_data = ticket.model_dump()
+        sale_data["items"] = [item.model_dump() for item in ticket.items]
+        sale_data["user_id"] = current_user.id
+        sale_data["customer_id"] = None  # Customers deprecated
+        sale_data["status"] = "completed"
+        sale_data["created_at"] = created_at
+        db_sales.append(Sale(**sale_data))
+    db.add_all(db_sales)
+    await db.flush()
+
+    await record_sale_items(db, *db_sales)
+    await record_sales(db, db_sales)
+    await record_product_sales(db, db_sales)
+
+    for (index, _), db_sale in zip(accepted, db_sales):
+        results[index].sale_id = db_sale.id
 
+    response = SaleBatchResponse(results=results, created=len(db_sales), failed=len(results) - len(db_sales))
+    if idempotency_key:
+        await save_response(
+            db, "sales:batch", idempotency_key, current_user.id, request_hash,
+            status.HTTP_200_OK, response,
+        )
+    return response
+
+
+def _stats_from_rollup(totals: dict) -> TodayStats:
+    # Clientes deprecados (customer_id siempre es None): se reporta el número de tickets
     return TodayStats(
-        revenue_today=revenue_today,
-        products_sold_today=products_sold_today,
-        customers_today=customers_today,
-        transactions_today=len(sales_today),
+        revenue_today=totals["net_revenue"],
+        products_sold_today=totals["units_sold"],
+        customers_today=totals["transactions"],
+        transactions_today=totals["transactions"],
     )
 
 
+@router.get("/stats/today", response_model=TodayStats)
+async def get_today_stats(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """KPIs de hoy (día local de la tienda): ingresos netos, productos vendidos y clientes atendidos, leídos del acumulado diario."""
+    totals = await get_rollup_totals(db, *period_days("today"))
+    return _stats_from_rollup(totals)
+
+
 @router.get("/stats", response_model=TodayStats)
 async def get_stats(
     date_from: str | None = Query(None, description="YYYY-MM-DD o ISO datetime"),
     date_to: str | None = Query(None, description="YYYY-MM-DD o ISO datetime"),
+    period: str | None = Query(None, description="today|week|month (reemplaza date_from/date_to)"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """KPIs por rango de fechas: ingresos, productos vendidos, clientes/transacciones."""
-    start_dt, end_dt = _parse_date_range(date_from, date_to)
-    filters = []
-    if start_dt is not None:
-        filters.append(Sale.created_at >= start_dt)
-    if end_dt is not None:
-        filters.append(Sale.created_at <= end_dt)
-
-    result = await db.execute(select(Sale).where(*filters))
-    sales = result.scalars().all()
+    """KPIs por rango de fechas: ingresos, productos vendidos, clientes/transacciones.
+
+    Las fechas se interpretan en la zona horaria de la tienda. Los rangos por días completos
+    se resuelven con el acumulado diario; los rangos con hora exacta se calculan sobre las ventas.
+    En ambos casos se excluyen las ventas canceladas.
+    """
+    if period is not None:
+        if period not in PERIODS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"period inválido; use uno de: {', '.join(PERIODS)}"
+            )
+        day_bounds = period_days(period)
+    else:
+        day_bounds = parse_day_range(date_from, date_to)
+    if day_bounds is not None:
+        totals = await get_rollup_totals(db, *day_bounds)
+        return _stats_from_rollup(totals)
+
+    start_dt, end_dt = parse_date_range(date_from, date_to)
+    filters = [*range_filters(Sale.created_at, start_dt, end_dt), Sale.status != "cancelled"]
+    item_filters = [*range_filters(SaleItem.created_at, start_dt, end_dt), Sale.status != "cancelled"]
 
     # Use net totals for revenue
-    revenue = 0.0
-    if sales:
-        for s in sales:
-            ret_res = await db.execute(select(func.coalesce(func.sum(ReturnModel.total_refund), 0.0)).where(ReturnModel.sale_id == s.id, ReturnModel.status == 'completed'))
-            total_ref = float(ret_res.scalar() or 0.0)
-            revenue += float(s.total) - total_ref
-    products_sold = 0
-    customers_set: set[int] = set()
-    for s in sales:
-        try:
-            items = s.items or []
-            for it in items:
-                qty = it.get('quantity', 0) if isinstance(it, dict) else 0
-                products_sold += int(qty or 0)
-        except Exception:
-            pass
-        if s.customer_id:
-            customers_set.add(s.customer_id)
-
-    customers = len(customers_set) if len(customers_set) > 0 else len(sales)
+    totals_result = await db.execute(
+        select(
+            func.count(Sale.id),
+            func.coalesce(func.sum(Sale.total - Sale.refunded_total), 0.0),
+        )
+        .where(*filters)
+    )
+    transactions, revenue = totals_result.one()
+    units_result = await db.execute(
+        select(func.coalesce(func.sum(SaleItem.quantity), 0))
+        .join(Sale, Sale.id == SaleItem.sale_id)
+        .where(*item_filters)
+    )
+    products_sold = int(units_result.scalar() or 0)
 
     return TodayStats(
-        revenue_today=revenue,
+        revenue_today=float(revenue or 0.0),
         products_sold_today=products_sold,
-        customers_today=customers,
-        transactions_today=len(sales),
+        customers_today=int(transactions or 0),
+        transactions_today=int(transactions or 0),
+    )
+
+
+# Rango por defecto de la serie según el tamaño del bucket
+TIMESERIES_DEFAULT_SPAN = {
+    "hour": timedelta(days=1),
+    "day": timedelta(days=30),
+    "week": timedelta(weeks=12),
+    "month": timedelta(days=365),
+}
+
+
+@router.get("/timeseries", response_model=SalesTimeseries)
+async def get_sales_timeseries(
+    bucket: str = Query("day", description="hour|day|week|month"),
+    date_from: str | None = Query(None, description="YYYY-MM-DD o ISO datetime"),
+    date_to: str | None = Query(None, description="YYYY-MM-DD o ISO datetime"),
+    status_param: str | None = Query(None, alias="status"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Serie de tiempo de ventas: tickets, unidades, ingresos e ingresos netos por bucket.
+
+    Una sola consulta GROUP BY por cuarto de hora UTC sobre el rango de created_at (índice de sales);
+    los cuartos de hora se pliegan en buckets de la zona horaria de la tienda (settings.TIMEZONE).
+    Sin `status` se excluyen las ventas canceladas.
+    """
+    if bucket not in BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"bucket inválido; use uno de: {', '.join(BUCKETS)}"
+        )
+    start_dt, end_dt = parse_date_range(date_from, date_to)
+    if end_dt is None:
+        end_dt = datetime.utcnow()
+    if start_dt is None:
+        start_dt = end_dt - TIMESERIES_DEFAULT_SPAN[bucket]
+    if start_dt >= end_dt:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_from debe ser anterior a date_to")
+    if count_buckets(start_dt, end_dt, bucket) > MAX_POINTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Rango demasiado amplio para bucket={bucket} (máximo {MAX_POINTS} puntos)"
+        )
+
+    filters = range_filters(Sale.created_at, start_dt, end_dt)
+    if status_param:
+        filters.append(Sale.status == status_param)
+    else:
+        # Igual que los KPIs y el top de productos: las canceladas no cuentan
+        filters.append(Sale.status != "cancelled")
+
+    # Unidades por venta desde sale_items (misma ventana: created_at es copia de la venta)
+    units = (
+        select(SaleItem.sale_id.label('sale_id'), func.sum(SaleItem.quantity).label('units'))
+        .where(*range_filters(SaleItem.created_at, start_dt, end_dt))
+        .group_by(SaleItem.sale_id)
+        .subquery()
+    )
+    slot_size, shift = slot_plan(bucket, start_dt, end_dt)
+    slot = utc_slot_key(Sale.created_at, db.bind.dialect.name, slot_size, shift).label('slot')
+    result = await db.execute(
+        select(
+            slot,
+            func.count(Sale.id),
+            func.coalesce(func.sum(units.c.units), 0),
+            func.coalesce(func.sum(Sale.total), 0.0),
+            func.coalesce(func.sum(Sale.total - Sale.refunded_total), 0.0),
+        )
+        .outerjoin(units, units.c.sale_id == Sale.id)
+        .where(*filters)
+        .group_by(slot)
+    )
+    points = fold_slots(result.all(), bucket, start_dt, end_dt, shift)
+    return SalesTimeseries(bucket=bucket, timezone=settings.TIMEZONE, points=points)
+
+
+@router.get("/register-close", response_model=RegisterClose)
+async def get_register_close(
+    user_id: str | None = Query(None, description="Cajero (por defecto el usuario actual)"),
+    date_from: str | None = Query(None, alias="from", description="YYYY-MM-DD o ISO datetime (por defecto hoy)"),
+    date_to: str | None = Query(None, alias="to", description="YYYY-MM-DD o ISO datetime"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Corte de caja de un cajero: totales por método de pago, reembolsos y efectivo esperado.
+
+    Dos consultas GROUP BY (ventas y devoluciones) sobre los índices (user_id, created_at);
+    sin rango se usa el día actual de la tienda. Solo admin/manager pueden consultar otro cajero.
+    """
+    user_id = user_id or current_user.id
+    if user_id != current_user.id and current_user.role not in ["admin", "manager"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No autorizado para consultar el corte de otro usuario")
+
+    start_dt, end_dt = parse_date_range(date_from, date_to)
+    if start_dt is None and end_dt is None:
+        start_dt, end_dt = day_window(*period_days("today"))
+    end_dt = end_dt or datetime.utcnow()
+    if start_dt is not None and start_dt >= end_dt:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="from debe ser anterior a to")
+
+    sales_result = await db.execute(
+        select(Sale.payment_method, Sale.status, func.count(Sale.id), func.coalesce(func.sum(Sale.total), 0.0))
+        .where(Sale.user_id == user_id, *range_filters(Sale.created_at, start_dt, end_dt))
+        .group_by(Sale.payment_method, Sale.status)
+    )
+    payments: dict[str, dict] = {}
+    cancelled = 0
+    for method, sale_status, tickets, total in sales_result.all():
+        if sale_status == "cancelled":
+            cancelled += int(tickets or 0)
+        if sale_status != "completed":
+            continue
+        payments[method] = {"payment_method": method, "tickets": int(tickets or 0), "total": round(float(total or 0.0), 2)}
+
+    # Solo los reembolsos mueven dinero (las notas de crédito y cambios no salen de caja)
+    refunds_result = await db.execute(
+        select(Return.refund_method, func.count(Return.id), func.coalesce(func.sum(Return.total_refund), 0.0))
+        .where(
+            Return.user_id == user_id,
+            Return.action == "refund",
+            Return.status == "completed",
+            *range_filters(Return.created_at, start_dt, end_dt),
+        )
+        .group_by(Return.refund_method)
+    )
+    refunds = [
+        {"refund_method": method, "count": int(count or 0), "total": round(float(total or 0.0), 2)}
+        for method, count, total in refunds_result.all()
+    ]
+
+    gross_total = sum(p["total"] for p in payments.values())
+    refunds_total = sum(r["total"] for r in refunds)
+    cash_sales = payments.get("cash", {}).get("total", 0.0)
+    cash_refunds = sum(r["total"] for r in refunds if r["refund_method"] == "cash")
+    return RegisterClose(
+        user_id=user_id,
+        date_from=start_dt,
+        date_to=end_dt,
+        tickets=sum(p["tickets"] for p in payments.values()),
+        cancelled_tickets=cancelled,
+        gross_total=round(gross_total, 2),
+        refunds_total=round(refunds_total, 2),
+        net_total=round(gross_total - refunds_total, 2),
+        expected_cash=round(cash_sales - cash_refunds, 2),
+        payments=sorted(payments.values(), key=lambda p: p["payment_method"]),
+        refunds=sorted(refunds, key=lambda r: r["refund_method"] or ""),
     )
 
 
@@ -248,13 +613,8 @@ async def get_recent_sales(
     result = await db.execute(select(Sale).order_by(Sale.created_at.desc()).limit(limit))
     sales = result.scalars().all()
     # attach net_total
-    items_with_net = []
-    for s in sales:
-        ret_res = await db.execute(select(func.coalesce(func.sum(ReturnModel.total_refund), 0.0)).where(ReturnModel.sale_id == s.id, ReturnModel.status == 'completed'))
-        total_ref = float(ret_res.scalar() or 0.0)
-        setattr(s, 'net_total', float(s.total) - total_ref)
-        items_with_net.append(s)
-    return {"items": items_with_net, "total": len(items_with_net)}
+    attach_net_totals(sales)
+    return {"items": sales, "total": len(sales)}
 
 
 @router.get("/top-products", response_model=TopProducts)
@@ -265,106 +625,99 @@ async def get_top_products(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Top productos más vendidos (por cantidad) en el rango dado, basados en items JSON de ventas."""
-    start_dt, end_dt = _parse_date_range(date_from, date_to)
-    filters = []
-    if start_dt is not None:
-      filters.append(Sale.created_at >= start_dt)
-    if end_dt is not None:
-      filters.append(Sale.created_at <= end_dt)
-
-    result = await db.execute(select(Sale).where(*filters))
-    sales = result.scalars().all()
-
-    agg: dict[str, dict] = {}
-    for s in sales:
-        items = s.items or []
-        if not isinstance(items, list):
-            continue
-        for it in items:
-            if not isinstance(it, dict):
-                continue
-            name = str(it.get('product_name') or 'Producto')
-            pid = it.get('product_id')
-            qty = int(it.get('quantity') or 0)
-            subtotal = float(it.get('subtotal') or 0)
-            key = f"{pid}:{name}"
-            if key not in agg:
-                agg[key] = { 'product_id': pid, 'product_name': name, 'total_quantity': 0, 'total_revenue': 0.0 }
-            agg[key]['total_quantity'] += qty
-            agg[key]['total_revenue'] += subtotal
-
-    items = [TopProduct(product_id=v['product_id'], product_name=v['product_name'], total_quantity=v['total_quantity'], total_revenue=v['total_revenue']) for v in agg.values()]
-    items.sort(key=lambda x: (-x.total_quantity, -x.total_revenue))
+    """Top productos más vendidos (por cantidad) en el rango dado.
+
+    Rangos de días completos se leen del acumulado product_daily_sales; rangos con hora se
+    agregan en SQL sobre sale_items. En ambos casos las cantidades son netas de devoluciones
+    y las ventas canceladas no cuentan.
+    """
+    day_bounds = parse_day_range(date_from, date_to)
+    if day_bounds is not None:
+        rows = await get_rollup_top_products(db, *day_bounds, limit=limit)
+        items = [
+            TopProduct(product_id=pid, product_name=name, total_quantity=int(qty or 0), total_revenue=float(rev or 0.0))
+            for pid, name, qty, rev in rows
+        ]
+        return { 'items': items }
+
+    start_dt, end_dt = parse_date_range(date_from, date_to)
+    returned = await returned_line_totals(db, [*range_filters(Sale.created_at, start_dt, end_dt), Sale.status != "cancelled"])
+
+    total_quantity = func.sum(SaleItem.quantity)
+    total_revenue = func.sum(SaleItem.subtotal)
+    # Las devoluciones solo bajan cantidades: el top neto está dentro del top bruto de
+    # limit + (productos con devoluciones)
+    result = await db.execute(
+        select(SaleItem.product_id, func.max(SaleItem.product_name), total_quantity, total_revenue)
+        .join(Sale, Sale.id == SaleItem.sale_id)
+        .where(*range_filters(SaleItem.created_at, start_dt, end_dt), Sale.status != "cancelled")
+        .group_by(SaleItem.product_id)
+        .order_by(total_quantity.desc(), total_revenue.desc())
+        .limit(limit + len(returned))
+    )
+    items = []
+    for pid, name, qty, rev in result.all():
+        line = returned.get(pid, {"quantity": 0, "subtotal": 0.0})
+        quantity = int(qty or 0) - line["quantity"]
+        if quantity > 0:
+            items.append(TopProduct(product_id=pid, product_name=name, total_quantity=quantity, total_revenue=float(rev or 0.0) - line["subtotal"]))
+    items.sort(key=lambda it: (it.total_quantity, it.total_revenue), reverse=True)
     return { 'items': items[:limit] }
 
 
 @router.get("/export")
-async def export_sales_csv(
+async def export_sales(
     date_from: str | None = Query(None, description="YYYY-MM-DD o ISO datetime"),
     date_to: str | None = Query(None, description="YYYY-MM-DD o ISO datetime"),
     sale_id: int | None = Query(None, description="Filtrar por ID de venta"),
     payment_method: str | None = None,
     status_param: str | None = Query(None, alias="status"),
-    db: AsyncSession = Depends(get_db),
+    product_id: int | None = Query(None, description="Solo ventas que incluyen este producto"),
+    sku: str | None = Query(None, description="Solo ventas que incluyen el producto con este SKU"),
+    export_format: str = Query("csv", alias="format", description="csv|xlsx|ndjson"),
     current_user: User = Depends(get_current_user)
 ):
-    """Exporta ventas en CSV usando los mismos filtros del listado."""
-    start_dt, end_dt = _parse_date_range(date_from, date_to)
-    filters = []
-    if start_dt is not None:
-        filters.append(Sale.created_at >= start_dt)
-    if end_dt is not None:
-        filters.append(Sale.created_at <= end_dt)
-    if payment_method:
-        filters.append(Sale.payment_method == payment_method)
-    if status_param:
-        filters.append(Sale.status == status_param)
-    if sale_id is not None:
-        filters.append(Sale.id == sale_id)
-
-    result = await db.execute(select(Sale).where(*filters).order_by(Sale.created_at.desc()))
-    sales = result.scalars().all()
+    """Exporta ventas en CSV, XLSX o NDJSON usando los mismos filtros del listado.
+
+    Las filas se leen por bloques con un cursor del servidor (neto desde refunded_total,
+    unidades desde sale_items) y cada bloque se envía en cuanto se codifica, sin materializar
+    el archivo completo.
+    """
+    filters = _sale_filters(date_from, date_to, sale_id, payment_method, status_param, product_id, sku)
+
+    stmt = (
+        select(
+            Sale.id,
+            Sale.created_at,
+            Sale.payment_method,
+            Sale.status,
+            Sale.subtotal,
+            Sale.tax,
+            Sale.discount,
+            Sale.total,
+            (Sale.total - Sale.refunded_total).label('net_total'),
+            _items_count().label('items_count'),
+        )
+        .where(*filters)
+        .order_by(Sale.created_at.desc(), Sale.id.desc())
+    )
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    # encabezados
-    writer.writerow([
-        'id', 'created_at', 'payment_method', 'status', 'subtotal', 'tax', 'discount', 'total', 'net_total', 'items_count'
-    ])
-    for s in sales:
-        # compute net_total per sale for export
-        ret_res = await db.execute(select(func.coalesce(func.sum(ReturnModel.total_refund), 0.0)).where(ReturnModel.sale_id == s.id, ReturnModel.status == 'completed'))
-        total_ref = float(ret_res.scalar() or 0.0)
-        net_total = float(s.total) - total_ref
-        items = s.items or []
-        items_count = 0
-        try:
-            for it in items:
-                qty = it.get('quantity', 0) if isinstance(it, dict) else 0
-                items_count += int(qty or 0)
-        except Exception:
-            pass
-        writer.writerow([
+    def to_row(s):
+        return [
             s.id,
-            s.created_at.isoformat() if getattr(s, 'created_at', None) else '',
+            s.created_at,
             s.payment_method,
             s.status,
-            f"{s.subtotal:.2f}",
-            f"{s.tax:.2f}",
-            f"{s.discount:.2f}",
-            f"{s.total:.2f}",
-            f"{net_total:.2f}",
-            items_count,
-        ])
-
-    output.seek(0)
-    filename = f"sales_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    return StreamingResponse(
-        iter([output.getvalue().encode('utf-8-sig')]),
-        media_type='text/csv',
-        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
-    )
+            round(float(s.subtotal), 2),
+            round(float(s.tax), 2),
+            round(float(s.discount or 0.0), 2),
+            round(float(s.total), 2),
+            round(float(s.net_total), 2),
+            int(s.items_count or 0),
+        ]
+
+    header = ['id', 'created_at', 'payment_method', 'status', 'subtotal', 'tax', 'discount', 'total', 'net_total', 'items_count']
+    return export_response(export_format, "sales_export", header, stmt, to_row)
 
 
 @router.get("/{sale_id}", response_model=SaleSchema)#Obtener venta por ID
@@ -383,10 +736,7 @@ async def get_sale(
             detail="Venta no encontrada"
         )
     
-    if sale:
-        ret_res = await db.execute(select(func.coalesce(func.sum(ReturnModel.total_refund), 0.0)).where(ReturnModel.sale_id == sale.id, ReturnModel.status == 'completed'))
-        total_ref = float(ret_res.scalar() or 0.0)
-        setattr(sale, 'net_total', float(sale.total) - total_ref)
+    attach_net_totals([sale])
     return sale
 
 @router.put("/{sale_id}", response_model=SaleSchema)#Actualizar venta
@@ -406,13 +756,29 @@ async def update_sale(
             detail="Venta no encontrada"
         )
     
+    old_status = db_sale.status
+
     # Actualizar campos
     update_data = sale.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_sale, field, value)
+
+    # Cancelar devuelve el inventario; reactivar una venta cancelada lo vuelve a descontar
+    if db_sale.status == "cancelled" and old_status != "cancelled":
+        await restore_sale_inventory(db, db_sale)
+    elif old_status == "cancelled" and db_sale.status != "cancelled":
+        failed = await reapply_sale_inventory(db, db_sale)
+        if failed:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Stock insuficiente para reactivar la venta (productos: {', '.join(map(str, failed))})"
+            )
     
     await db.flush()
     await db.refresh(db_sale)
+
+    if db_sale.status != old_status:
+        await record_status_change(db, db_sale, old_status, db_sale.refunded_total)
     
     return db_sale
 
@@ -433,19 +799,15 @@ async def delete_sale(
             detail="Venta no encontrada"
         )
     
-    # Restaurar stock de productos antes de eliminar
-    items = db_sale.items or []
-    for item in items:
-        if isinstance(item, dict):
-            product_id = item.get('product_id')
-            quantity = item.get('quantity', 0)
-            if product_id and quantity:
-                product_result = await db.execute(select(Product).filter(Product.id == product_id))
-                product = product_result.scalar_one_or_none()
-                if product:
-                    product.stock += quantity
+    # Restaurar stock y acumulado por producto (una venta cancelada ya se revirtió)
+    if db_sale.status != "cancelled":
+        await restore_sale_inventory(db, db_sale)
     
-    # Eliminar la venta
+    # Retirar la venta del acumulado diario
+    await record_sale(db, db_sale, db_sale.refunded_total, sign=-1)
+
+    # Eliminar la venta y sus líneas
+    await db.execute(delete(SaleItem).where(SaleItem.sale_id == db_sale.id))
     await db.delete(db_sale)
     await db.commit()
     
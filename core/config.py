@@ -35,6 +35,20 @@ class Settings(BaseSettings):
     # Devoluciones
     RETURN_WINDOW_DAYS: int = 30
     
+    # Idempotencia (POST /sales/, POST /returns/)
+    IDEMPOTENCY_TTL_HOURS: int = 24
+    IDEMPOTENCY_CACHE_SIZE: int = 1024
+    
+    # Caché en proceso del catálogo de productos (lecturas por id, código de barras, SKU y listados)
+    PRODUCT_CACHE_SIZE: int = 10000
+    PRODUCT_CACHE_TTL_SECONDS: int = 60
+    
+    # Búsqueda de productos: "auto" (FTS5 en SQLite, FULLTEXT en MySQL) o "like" (ILIKE '%q%')
+    PRODUCT_SEARCH_BACKEND: str = "auto"
+    
+    # Procesos para generar miniaturas WebP de imágenes de productos (requiere Pillow)
+    THUMBNAIL_WORKERS: int = 2
+    
     @property
     def cors_origins_list(self) -> List[str]:
         """Convierte CORS_ORIGINS string a lista"""
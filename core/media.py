@@ -0,0 +1,39 @@
+"""
+Nombres y URLs de imágenes de productos y sus miniaturas (sin dependencias de base de datos)
+
+Lo usan tanto los schemas (image_variants) como los servicios de almacenamiento y miniaturas.
+"""
+import re
+
+# Lados máximos (px) de las miniaturas WebP generadas para cada imagen
+THUMBNAIL_SIZES = (64, 256, 1024)
+
+_VARIANT_NAME = re.compile(r"^([0-9A-Za-z]+)_(\d+)\.webp$")
+
+
+def product_media_url(product_id: int, filename: str) -> str:
+    """URL relativa (montaje /media) de una imagen de producto"""
+    return f"/media/products/{product_id}/{filename}"
+
+
+def variant_filename(original: str, size: int) -> str:
+    """Nombre de la miniatura de `size` px de una imagen (<nombre sin extensión>_<size>.webp)"""
+    return f"{original.rsplit('.', 1)[0]}_{size}.webp"
+
+
+def parse_variant_filename(filename: str) -> tuple[str, int] | None:
+    """(nombre base, tamaño) de un nombre de miniatura, o None si no tiene ese formato"""
+    match = _VARIANT_NAME.match(filename)
+    return (match.group(1), int(match.group(2))) if match else None
+
+
+def variant_urls(product_id: int, image_url: str | None) -> dict[str, str] | None:
+    """URLs de las miniaturas por tamaño de una imagen subida (None si no es de media/products/<id>/)"""
+    prefix = product_media_url(product_id, "")
+    if not image_url or not image_url.startswith(prefix):
+        return None
+    original = image_url[len(prefix):]
+    return {
+        str(size): f"/api/v1/products/{product_id}/thumbnails/{variant_filename(original, size)}"
+        for size in THUMBNAIL_SIZES
+    }
@@ -6,10 +6,15 @@ from db.session import Base
 # Importar todos los modelos para que SQLAlchemy los reconozca
 from models.product import Product
 from models.sale import Sale
+from models.sale_item import SaleItem
 from models.customer import Customer
 from models.user import User
 from models.audit_log import AuditLog
 from models.returns import Return
 from models.inventory_alert import InventoryAlert
+from models.daily_sales_rollup import DailySalesRollup
+from models.product_daily_sales import ProductDailySales
+from models.idempotency_key import IdempotencyKey
+from models.catalog import CatalogVersion, ProductTombstone
 
 __all__ = ["Base"]
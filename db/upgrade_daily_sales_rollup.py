@@ -0,0 +1,85 @@
+"""
+Script de migración para crear y recalcular el acumulado diario de ventas (daily_sales_rollup)
+
+Idempotente: crea la tabla si no existe y reconstruye todas sus filas a partir de
+sales y returns. Puede ejecutarse de nuevo en cualquier momento para reparar el acumulado.
+"""
+import sys
+import os
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, func, delete, insert
+from db.session import SessionLocal, sync_engine
+from models.sale import Sale
+from models.returns import Return
+from models.daily_sales_rollup import DailySalesRollup
+from services.rollups import sale_units
+from services.dates import sale_day
+
+BATCH_SIZE = 1000
+
+
+def rebuild_daily_sales_rollup():
+    """
+    Crear la tabla daily_sales_rollup (si no existe) y recalcularla desde las ventas
+
+    Returns:
+        Número de filas del acumulado generadas
+    """
+    DailySalesRollup.__table__.create(bind=sync_engine, checkfirst=True)
+
+    db = SessionLocal()
+    try:
+        refunds = dict(
+            db.execute(
+                select(Return.sale_id, func.sum(Return.total_refund))
+                .where(Return.status == 'completed')
+                .group_by(Return.sale_id)
+            ).all()
+        )
+
+        buckets: dict[tuple, dict] = {}
+        rows = db.execute(
+            select(
+                Sale.id, Sale.created_at, Sale.payment_method, Sale.user_id,
+                Sale.status, Sale.total, Sale.items,
+            ).execution_options(yield_per=BATCH_SIZE)
+        )
+        for s in rows:
+            key = (sale_day(s.created_at), s.payment_method, s.user_id, s.status)
+            b = buckets.setdefault(key, {"transactions": 0, "units_sold": 0, "revenue": 0.0, "net_revenue": 0.0})
+            total = float(s.total or 0.0)
+            b["transactions"] += 1
+            b["units_sold"] += sale_units(s.items)
+            b["revenue"] += total
+            b["net_revenue"] += total - float(refunds.get(s.id) or 0.0)
+
+        db.execute(delete(DailySalesRollup))
+        values = [
+            {"day": day, "payment_method": pm, "user_id": uid, "status": st, **counters}
+            for (day, pm, uid, st), counters in buckets.items()
+        ]
+        for i in range(0, len(values), BATCH_SIZE):
+            db.execute(insert(DailySalesRollup), values[i:i + BATCH_SIZE])
+        db.commit()
+        return len(values)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("MIGRACIÓN: Acumulado diario de ventas")
+    print("=" * 60)
+
+    try:
+        count = rebuild_daily_sales_rollup()
+        print(f"\n✓ Acumulado reconstruido: {count} filas")
+    except Exception as e:
+        print(f"\n✗ Error durante la migración: {str(e)}")
+        sys.exit(1)
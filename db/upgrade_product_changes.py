@@ -0,0 +1,68 @@
+"""
+Script de migración para el feed de cambios del catálogo (GET /products/changes)
+
+Idempotente: agrega products.change_seq y su índice, crea las tablas catalog_version y
+product_tombstones y la fila del contador. Los productos existentes quedan con change_seq = 0,
+así que una terminal sin cursor recibe todo el catálogo.
+"""
+import sys
+import os
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, text, select, insert
+from db.session import sync_engine
+from models.product import Product
+from models.catalog import CatalogVersion, ProductTombstone
+
+
+def upgrade_product_changes():
+    """
+    Preparar la base de datos para el feed de cambios del catálogo
+
+    Returns:
+        Lista de cambios aplicados
+    """
+    inspector = inspect(sync_engine)
+    applied = []
+
+    if "change_seq" not in {c["name"] for c in inspector.get_columns("products")}:
+        print("Agregando columna 'change_seq'...")
+        with sync_engine.begin() as conn:
+            conn.execute(text("ALTER TABLE products ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0"))
+        applied.append("products.change_seq")
+    else:
+        print("✓ La columna 'change_seq' ya existe")
+
+    existing = {ix["name"] for ix in inspector.get_indexes("products")}
+    for index in Product.__table__.indexes:
+        if index.name == "ix_products_change_seq_id" and index.name not in existing:
+            print(f"Creando índice '{index.name}'...")
+            index.create(bind=sync_engine)
+            applied.append(index.name)
+
+    for table in (CatalogVersion.__table__, ProductTombstone.__table__):
+        if not inspector.has_table(table.name):
+            print(f"Creando tabla '{table.name}'...")
+            table.create(bind=sync_engine)
+            applied.append(table.name)
+
+    with sync_engine.begin() as conn:
+        if conn.execute(select(CatalogVersion.id).where(CatalogVersion.id == 1)).first() is None:
+            conn.execute(insert(CatalogVersion).values(id=1, version=0))
+            applied.append("catalog_version.id=1")
+    return applied
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("MIGRACIÓN: Feed de cambios del catálogo")
+    print("=" * 60)
+
+    try:
+        applied = upgrade_product_changes()
+        print(f"\n✓ Migración completada. Cambios: {applied}")
+    except Exception as e:
+        print(f"\n✗ Error durante la migración: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,112 @@
+"""
+Script de migración para crear y recalcular las ventas diarias por producto (product_daily_sales)
+
+Idempotente: crea la tabla si no existe y reconstruye todas sus filas a partir de
+sale_items y returns. Puede ejecutarse de nuevo en cualquier momento para reparar el acumulado.
+
+Orden: depende de db/upgrade_sale_items.py. Para no reconstruir un acumulado vacío o parcial,
+primero completa sale_items (upgrade_sale_items, también idempotente) y aborta si no puede.
+"""
+import sys
+import os
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, delete, insert
+from db.session import SessionLocal, sync_engine
+from models.sale import Sale
+from models.sale_item import SaleItem
+from models.returns import Return
+from models.product_daily_sales import ProductDailySales
+from services.dates import sale_day
+from db.upgrade_sale_items import upgrade_sale_items
+
+BATCH_SIZE = 1000
+
+
+def rebuild_product_daily_sales():
+    """
+    Crear la tabla product_daily_sales (si no existe) y recalcularla desde las líneas de venta
+
+    Returns:
+        Número de filas del acumulado generadas
+
+    Raises:
+        RuntimeError: Si no se pudo completar sale_items antes de reconstruir
+    """
+    try:
+        upgrade_sale_items()
+    except Exception as e:
+        raise RuntimeError(
+            "No se pudieron completar las líneas de venta (sale_items); ejecute "
+            f"db/upgrade_sale_items.py antes de reconstruir product_daily_sales: {e}"
+        ) from e
+
+    ProductDailySales.__table__.create(bind=sync_engine, checkfirst=True)
+
+    db = SessionLocal()
+    try:
+        # Devoluciones primero (son pocas): cantidades devueltas por (venta, producto)
+        returned: dict[tuple[int, int], int] = {}
+        rows = db.execute(
+            select(Return.sale_id, Return.items_returned)
+            .join(Sale, Sale.id == Return.sale_id)
+            .execution_options(yield_per=BATCH_SIZE)
+        )
+        for r in rows:
+            for it in r.items_returned or []:
+                try:
+                    key = (r.sale_id, int(it.get("product_id")))
+                    returned[key] = returned.get(key, 0) + int(it.get("quantity", 0))
+                except (AttributeError, TypeError, ValueError):
+                    continue
+
+        buckets: dict[tuple, dict] = {}
+        rows = db.execute(
+            select(
+                SaleItem.sale_id, SaleItem.product_id, SaleItem.product_name,
+                SaleItem.quantity, SaleItem.unit_price, SaleItem.subtotal, SaleItem.created_at,
+            )
+            .order_by(SaleItem.id)
+            .execution_options(yield_per=BATCH_SIZE)
+        )
+        for it in rows:
+            key = (sale_day(it.created_at), it.product_id)
+            b = buckets.setdefault(key, {"product_name": it.product_name, "quantity": 0, "revenue": 0.0})
+            b["product_name"] = it.product_name
+            b["quantity"] += int(it.quantity or 0)
+            b["revenue"] += float(it.subtotal or 0.0)
+            # Descontar lo devuelto de esta venta y producto (una sola vez, en la primera línea que lo tenga)
+            qty_returned = returned.pop((it.sale_id, it.product_id), 0)
+            if qty_returned:
+                b["quantity"] -= qty_returned
+                b["revenue"] -= qty_returned * float(it.unit_price or 0.0)
+
+        db.execute(delete(ProductDailySales))
+        values = [
+            {"day": day, "product_id": pid, **counters}
+            for (day, pid), counters in buckets.items()
+        ]
+        for i in range(0, len(values), BATCH_SIZE):
+            db.execute(insert(ProductDailySales), values[i:i + BATCH_SIZE])
+        db.commit()
+        return len(values)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("MIGRACIÓN: Ventas diarias por producto")
+    print("=" * 60)
+
+    try:
+        count = rebuild_product_daily_sales()
+        print(f"\n✓ Acumulado reconstruido: {count} filas")
+    except Exception as e:
+        print(f"\n✗ Error durante la migración: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,42 @@
+"""
+Script de migración para crear el índice de búsqueda de productos
+
+- SQLite: tabla virtual FTS5 products_fts con triggers que la mantienen al día
+- MySQL: índice FULLTEXT ft_products_search (name, sku, barcode)
+
+Idempotente: si el índice ya existe no hace nada. En SQLite la tabla se llena con los productos existentes.
+"""
+import sys
+import os
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.session import sync_engine
+from services.product_search import ensure_search_index
+
+
+def upgrade_product_search():
+    """
+    Crear el índice de búsqueda del dialecto actual si no existe
+
+    Returns:
+        True si se creó el índice
+    """
+    with sync_engine.begin() as conn:
+        return ensure_search_index(conn)
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("MIGRACIÓN: Índice de búsqueda de productos")
+    print("=" * 60)
+
+    try:
+        if upgrade_product_search():
+            print("\n✓ Índice de búsqueda creado")
+        else:
+            print(f"\n✓ Nada que hacer (índice existente o dialecto '{sync_engine.dialect.name}' sin texto completo)")
+    except Exception as e:
+        print(f"\n✗ Error durante la migración: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,69 @@
+"""
+Script de migración para crear la tabla sale_items y poblarla desde Sale.items (JSON)
+
+Idempotente: solo inserta líneas para las ventas que todavía no tienen ninguna en sale_items.
+"""
+import sys
+import os
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, insert, exists
+from db.session import SessionLocal, sync_engine
+from models.sale import Sale
+from models.sale_item import SaleItem
+from services.sales import sale_item_rows
+
+BATCH_SIZE = 1000
+
+
+def upgrade_sale_items():
+    """
+    Crear la tabla sale_items (si no existe) y rellenarla a partir del JSON de ventas
+
+    Returns:
+        Tupla (ventas procesadas, líneas insertadas)
+    """
+    SaleItem.__table__.create(bind=sync_engine, checkfirst=True)
+
+    db = SessionLocal()
+    try:
+        # IDs primero: no se puede insertar en la misma conexión mientras un cursor del servidor sigue abierto
+        pending_ids = db.execute(
+            select(Sale.id)
+            .where(~exists().where(SaleItem.sale_id == Sale.id))
+            .order_by(Sale.id)
+        ).scalars().all()
+
+        lines_count = 0
+        for i in range(0, len(pending_ids), BATCH_SIZE):
+            chunk = pending_ids[i:i + BATCH_SIZE]
+            sales = db.execute(select(Sale).where(Sale.id.in_(chunk))).scalars().all()
+            rows = [row for sale in sales for row in sale_item_rows(sale)]
+            if rows:
+                db.execute(insert(SaleItem), rows)
+                lines_count += len(rows)
+            db.expunge_all()
+        sales_count = len(pending_ids)
+
+        db.commit()
+        return sales_count, lines_count
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("MIGRACIÓN: Líneas de venta (sale_items)")
+    print("=" * 60)
+
+    try:
+        sales_count, lines_count = upgrade_sale_items()
+        print(f"\n✓ {sales_count} ventas procesadas, {lines_count} líneas insertadas")
+    except Exception as e:
+        print(f"\n✗ Error durante la migración: {str(e)}")
+        sys.exit(1)
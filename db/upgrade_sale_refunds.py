@@ -0,0 +1,110 @@
+"""
+Script de migración para los acumulados de devoluciones en sales (refunded_total, returned_quantities)
+
+Idempotente: agrega las columnas si no existen y recalcula ambos valores para todas las ventas
+a partir de la tabla returns. Puede ejecutarse de nuevo en cualquier momento para repararlos.
+"""
+import sys
+import os
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, update, inspect, text
+from db.session import SessionLocal, sync_engine
+from models.sale import Sale
+from models.returns import Return
+
+BATCH_SIZE = 1000
+
+
+def ensure_sale_refund_columns():
+    """
+    Agregar a sales las columnas refunded_total y returned_quantities si no existen
+
+    Returns:
+        Lista de columnas agregadas
+    """
+    inspector = inspect(sync_engine)
+    existing = {c["name"] for c in inspector.get_columns("sales")}
+    dialect = sync_engine.dialect.name
+    json_type = "TEXT" if dialect == "sqlite" else "JSON"
+    columns = {
+        "refunded_total": "FLOAT NOT NULL DEFAULT 0",
+        "returned_quantities": f"{json_type} NULL",
+    }
+    added = []
+    with sync_engine.begin() as conn:
+        for name, ddl in columns.items():
+            if name in existing:
+                print(f"✓ La columna '{name}' ya existe")
+                continue
+            print(f"Agregando columna '{name}'...")
+            conn.execute(text(f"ALTER TABLE sales ADD COLUMN {name} {ddl}"))
+            added.append(name)
+    return added
+
+
+def rebuild_sale_refunds():
+    """
+    Recalcular refunded_total y returned_quantities de todas las ventas desde returns
+
+    Returns:
+        Número de ventas con devoluciones
+    """
+    db = SessionLocal()
+    try:
+        refunded: dict[int, float] = {}
+        quantities: dict[int, dict[str, int]] = {}
+        rows = db.execute(
+            select(Return.sale_id, Return.status, Return.total_refund, Return.items_returned)
+            .join(Sale, Sale.id == Return.sale_id)
+            .execution_options(yield_per=BATCH_SIZE)
+        )
+        for r in rows:
+            if r.status == 'completed':
+                refunded[r.sale_id] = refunded.get(r.sale_id, 0.0) + float(r.total_refund or 0.0)
+            returned = quantities.setdefault(r.sale_id, {})
+            for it in r.items_returned or []:
+                try:
+                    pid = str(int(it.get("product_id")))
+                    returned[pid] = returned.get(pid, 0) + int(it.get("quantity", 0))
+                except (AttributeError, TypeError, ValueError):
+                    continue
+
+        db.execute(
+            update(Sale)
+            .values(refunded_total=0.0, returned_quantities=None)
+            .execution_options(synchronize_session=False)
+        )
+        values = [
+            {
+                "id": sale_id,
+                "refunded_total": round(refunded.get(sale_id, 0.0), 2),
+                "returned_quantities": quantities.get(sale_id) or None,
+            }
+            for sale_id in set(refunded) | set(quantities)
+        ]
+        for i in range(0, len(values), BATCH_SIZE):
+            db.execute(update(Sale), values[i:i + BATCH_SIZE])
+        db.commit()
+        return len(values)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("MIGRACIÓN: Acumulados de devoluciones por venta")
+    print("=" * 60)
+
+    try:
+        added = ensure_sale_refund_columns()
+        count = rebuild_sale_refunds()
+        print(f"\n✓ Columnas agregadas: {added}. Ventas con devoluciones recalculadas: {count}")
+    except Exception as e:
+        print(f"\n✗ Error durante la migración: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,49 @@
+"""
+Script de migración para crear en las tablas sales y returns los índices declarados en los modelos
+
+Idempotente: create_all no agrega índices a tablas existentes, este script crea solo los faltantes.
+"""
+import sys
+import os
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect
+from db.session import sync_engine
+from models.sale import Sale
+from models.returns import Return
+
+
+def upgrade_sales_indexes():
+    """
+    Crear los índices de Sale.__table__ y Return.__table__ que no existan en la base de datos
+
+    Returns:
+        Lista de nombres de índices creados
+    """
+    inspector = inspect(sync_engine)
+    created = []
+    for table in (Sale.__table__, Return.__table__):
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                print(f"✓ El índice '{index.name}' ya existe")
+                continue
+            print(f"Creando índice '{index.name}'...")
+            index.create(bind=sync_engine)
+            created.append(index.name)
+    return created
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("MIGRACIÓN: Índices de ventas y devoluciones")
+    print("=" * 60)
+
+    try:
+        created = upgrade_sales_indexes()
+        print(f"\n✓ Migración completada. Índices creados: {created}")
+    except Exception as e:
+        print(f"\n✗ Error durante la migración: {str(e)}")
+        sys.exit(1)
@@ -9,10 +9,15 @@ from core.config import settings
 from api.v1 import api_router
 from db.session import sync_engine
 from db.base import Base
+from services.product_search import ensure_search_index
 
 # Crear tablas en MySQL
 Base.metadata.create_all(bind=sync_engine)
 
+# Índice de búsqueda de productos (FTS5/FULLTEXT); create_all no lo crea
+with sync_engine.begin() as conn:
+    ensure_search_index(conn)
+
 # Crear aplicación
 app = FastAPI(
     title=settings.APP_NAME,
@@ -5,7 +5,12 @@ from models.user import User
 from models.product import Product
 from models.customer import Customer
 from models.sale import Sale
+from models.sale_item import SaleItem
 from models.returns import Return
 from models.inventory_alert import InventoryAlert
+from models.daily_sales_rollup import DailySalesRollup
+from models.product_daily_sales import ProductDailySales
+from models.idempotency_key import IdempotencyKey
+from models.catalog import CatalogVersion, ProductTombstone
 
-__all__ = ["User", "Product", "Customer", "Sale", "Return", "InventoryAlert"]
+__all__ = ["User", "Product", "Customer", "Sale", "SaleItem", "Return", "InventoryAlert", "DailySalesRollup", "ProductDailySales", "IdempotencyKey", "CatalogVersion", "ProductTombstone"]
@@ -0,0 +1,30 @@
+"""
+Modelos del versionado del catálogo: contador de versión y lápidas de productos eliminados
+"""
+from sqlalchemy import Column, Integer, DateTime
+from sqlalchemy.sql import func
+from db.session import Base
+
+
+class CatalogVersion(Base):
+    """
+    Contador global (una sola fila, id=1) de cambios del catálogo de productos.
+
+    Cada transacción que modifica productos lo incrementa una vez; el bloqueo de la fila dura
+    hasta el commit, así los números de cambio se confirman en orden y un cursor nunca salta
+    un cambio de una transacción que aún no terminaba.
+    """
+    __tablename__ = "catalog_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class ProductTombstone(Base):
+    """Producto eliminado, para que las terminales lo borren de su copia local del catálogo"""
+    __tablename__ = "product_tombstones"
+
+    product_id = Column(Integer, primary_key=True, autoincrement=False)
+    change_seq = Column(Integer, nullable=False, index=True)  # versión del catálogo en que se eliminó
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now())
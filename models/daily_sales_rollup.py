@@ -0,0 +1,30 @@
+"""
+Modelo de acumulado diario de ventas
+"""
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, UniqueConstraint
+from sqlalchemy.dialects.mysql import CHAR
+from sqlalchemy.sql import func
+from db.session import Base
+
+
+class DailySalesRollup(Base):
+    __tablename__ = "daily_sales_rollup"
+    __table_args__ = (
+        UniqueConstraint("day", "payment_method", "user_id", "status", name="ux_daily_sales_rollup_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Llave: día local de la tienda (settings.TIMEZONE), método de pago, cajero y estado
+    day = Column(Date, nullable=False, index=True)
+    payment_method = Column(String(20), nullable=False)
+    user_id = Column(CHAR(36), nullable=False)
+    status = Column(String(20), nullable=False)
+
+    # Acumulados
+    transactions = Column(Integer, default=0, nullable=False)
+    units_sold = Column(Integer, default=0, nullable=False)  # unidades brutas: las devoluciones no se restan
+    revenue = Column(Float, default=0.0, nullable=False)  # suma de Sale.total
+    net_revenue = Column(Float, default=0.0, nullable=False)  # revenue menos reembolsos completados
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
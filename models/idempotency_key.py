@@ -0,0 +1,25 @@
+"""
+Modelo de llave de idempotencia (respuesta almacenada de un POST reintentado)
+"""
+from sqlalchemy import Column, Integer, String, DateTime, JSON, UniqueConstraint
+from sqlalchemy.dialects.mysql import CHAR
+from sqlalchemy.sql import func
+from db.session import Base
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("key", "scope", "user_id", name="ux_idempotency_keys_key_scope_user"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String(100), nullable=False)  # valor del header Idempotency-Key
+    scope = Column(String(50), nullable=False)  # endpoint, e.g. sales:create
+    user_id = Column(CHAR(36), nullable=False)
+    request_hash = Column(String(64), nullable=False)  # sha256 del cuerpo de la petición
+
+    status_code = Column(Integer, nullable=False)
+    response_body = Column(JSON, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -1,13 +1,17 @@
 """
 Modelo de Producto
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Index
 from sqlalchemy.sql import func
 from db.session import Base
 
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # Feed de cambios del catálogo (change_seq, id) > cursor
+        Index("ix_products_change_seq_id", "change_seq", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(200), nullable=False, index=True)
@@ -26,5 +30,8 @@ class Product(Base):
     promotion_end = Column(DateTime(timezone=True), nullable=True)
     promotion_description = Column(String(500), nullable=True)
     
+    # Versión del catálogo en que cambió por última vez (ver models/catalog.py)
+    change_seq = Column(Integer, default=0, server_default="0", nullable=False)
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -0,0 +1,27 @@
+"""
+Modelo de ventas diarias por producto (acumulado para top de productos)
+"""
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, UniqueConstraint, Index
+from sqlalchemy.sql import func
+from db.session import Base
+
+
+class ProductDailySales(Base):
+    __tablename__ = "product_daily_sales"
+    __table_args__ = (
+        UniqueConstraint("day", "product_id", name="ux_product_daily_sales_day_product"),
+        Index("ix_product_daily_sales_product_day", "product_id", "day"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Llave: día local de la tienda (settings.TIMEZONE) de la venta y producto
+    day = Column(Date, nullable=False)
+    product_id = Column(Integer, nullable=False)  # sin FK, igual que sale_items
+    product_name = Column(String(200), nullable=False)  # último nombre vendido
+
+    # Acumulados netos de devoluciones
+    quantity = Column(Integer, default=0, nullable=False)
+    revenue = Column(Float, default=0.0, nullable=False)  # suma de subtotales de línea
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,7 +1,7 @@
 """
 Modelo de Devolución
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.dialects.mysql import CHAR
 from sqlalchemy.sql import func
 from db.session import Base
@@ -9,6 +9,12 @@ from db.session import Base
 
 class Return(Base):
     __tablename__ = "returns"
+    __table_args__ = (
+        # Filtros por rango semiabierto de fechas (created_at >= inicio AND created_at < fin)
+        Index("ix_returns_created_at", "created_at"),
+        # Corte de caja por cajero y turno
+        Index("ix_returns_user_created_at", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False)
@@ -1,7 +1,7 @@
 """
 Modelo de Venta
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.dialects.mysql import CHAR
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -10,6 +10,12 @@ from db.session import Base
 
 class Sale(Base):
     __tablename__ = "sales"
+    __table_args__ = (
+        # Respaldo de la paginación por cursor (created_at DESC, id DESC)
+        Index("ix_sales_created_at_id", "created_at", "id"),
+        # Corte de caja por cajero y turno (user_id = ... AND created_at en rango)
+        Index("ix_sales_user_created_at", "user_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     items = Column(JSON, nullable=False)  # Lista de items vendidos
@@ -19,6 +25,10 @@ class Sale(Base):
     total = Column(Float, nullable=False)
     payment_method = Column(String(20), nullable=False)  # cash, card, transfer
     status = Column(String(20), default="completed", nullable=False)  # pending, completed, cancelled
+
+    # Acumulados de devoluciones, mantenidos por create_return (ver db/upgrade_sale_refunds.py)
+    refunded_total = Column(Float, default=0.0, server_default="0", nullable=False)  # Reembolsos completados
+    returned_quantities = Column(JSON, nullable=True)  # {"product_id": cantidad devuelta}
     
     # Relaciones
     customer_id = Column(Integer, ForeignKey("customers.id"), nullable=True)
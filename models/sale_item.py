@@ -0,0 +1,24 @@
+"""
+Modelo de línea de venta (normalización de Sale.items)
+"""
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
+from db.session import Base
+
+
+class SaleItem(Base):
+    __tablename__ = "sale_items"
+    __table_args__ = (
+        Index("ix_sale_items_product_created", "product_id", "created_at"),
+        Index("ix_sale_items_sale_id", "sale_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    sale_id = Column(Integer, ForeignKey("sales.id", ondelete="CASCADE"), nullable=False)
+    product_id = Column(Integer, nullable=False)  # sin FK: la línea sobrevive si el producto se elimina
+    product_name = Column(String(200), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    unit_price = Column(Float, nullable=False)
+    subtotal = Column(Float, nullable=False)
+
+    # Copia de Sale.created_at para filtrar por rango sin unir con sales
+    created_at = Column(DateTime(timezone=True), nullable=True)
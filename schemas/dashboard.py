@@ -0,0 +1,15 @@
+"""
+Schemas del Dashboard con Pydantic
+"""
+from pydantic import BaseModel
+
+from schemas.sale import TodayStats, SaleList, TopProducts
+from schemas.inventory_alert import AlertStats
+
+
+class DashboardSummary(BaseModel):
+    """Resumen del dashboard: los cuatro paneles en una sola respuesta"""
+    today: TodayStats
+    recent_sales: SaleList
+    top_products: TopProducts
+    alerts: AlertStats
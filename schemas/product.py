@@ -1,10 +1,12 @@
 """
 Schemas de Producto con Pydantic
 """
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, validator, computed_field
 from typing import Optional
 from datetime import datetime
 
+from core.media import variant_urls
+
 
 class ProductBase(BaseModel):
     """Base de producto"""
@@ -55,6 +57,12 @@ class Product(ProductBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     
+    @computed_field
+    @property
+    def image_variants(self) -> Optional[dict[str, str]]:
+        """URLs de las miniaturas WebP por lado máximo en px ("64", "256", "1024")"""
+        return variant_urls(self.id, self.image_url)
+    
     class Config:
         from_attributes = True
 
@@ -63,3 +71,62 @@ class ProductList(BaseModel):
     """Lista de productos"""
     items: list[Product]
     total: int
+
+
+class ProductLookup(BaseModel):
+    """Producto compacto para lectores de código de barras (lo necesario para el ticket)"""
+    id: int
+    name: str
+    price: float
+    stock: int
+    sku: Optional[str] = None
+    barcode: Optional[str] = None
+    discount_percentage: float = 0.0
+    has_promotion: bool = False
+
+    class Config:
+        from_attributes = True
+
+
+class ProductLookupBatchRequest(BaseModel):
+    """Varios códigos a buscar en una sola petición"""
+    barcodes: list[str] = Field(default_factory=list, max_length=200)
+    skus: list[str] = Field(default_factory=list, max_length=200)
+
+
+class ProductLookupBatch(BaseModel):
+    """Resultado de una búsqueda por lote"""
+    items: list[ProductLookup]
+    missing_barcodes: list[str] = []
+    missing_skus: list[str] = []
+
+
+class ProductChange(BaseModel):
+    """Producto creado/modificado o eliminado (deleted=true, solo id) desde un cursor"""
+    id: int
+    change_seq: int
+    deleted: bool = False
+    name: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[float] = None
+    category: Optional[str] = None
+    sku: Optional[str] = None
+    barcode: Optional[str] = None
+    image_url: Optional[str] = None
+    discount_percentage: Optional[float] = None
+    has_promotion: Optional[bool] = None
+    promotion_start: Optional[datetime] = None
+    promotion_end: Optional[datetime] = None
+    promotion_description: Optional[str] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ProductChanges(BaseModel):
+    """Página del feed de cambios del catálogo"""
+    items: list[ProductChange]
+    next_cursor: str  # pasar como since en la siguiente petición
+    has_more: bool
+    version: int  # versión actual del catálogo
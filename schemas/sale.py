@@ -1,7 +1,7 @@
 """
 Schemas de Venta con Pydantic
 """
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -31,6 +31,26 @@ class SaleCreate(SaleBase):
     pass
 
 
+class SaleBatchCreate(BaseModel):
+    """Lote de ventas capturadas sin conexión para registrar en una sola petición"""
+    sales: List[SaleCreate] = Field(..., min_length=1, max_length=1000)
+
+
+class SaleBatchResult(BaseModel):
+    """Resultado por ticket de un lote"""
+    index: int  # posición del ticket en el lote
+    ok: bool
+    sale_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class SaleBatchResponse(BaseModel):
+    """Respuesta de registro por lote"""
+    results: list[SaleBatchResult]
+    created: int
+    failed: int
+
+
 class SaleUpdate(BaseModel):
     """Schema para actualizar venta"""
     status: Optional[str] = None  # pending, completed, cancelled
@@ -43,6 +63,8 @@ class Sale(SaleBase):
     status: str
     created_at: datetime
     updated_at: Optional[datetime] = None
+    # Reembolsos completados acumulados de la venta
+    refunded_total: Optional[float] = None
     # Total neto (total de la venta menos reembolsos de devoluciones asociadas)
     net_total: Optional[float] = None
     
@@ -53,7 +75,33 @@ class Sale(SaleBase):
 class SaleList(BaseModel):
     """Lista de ventas"""
     items: list[Sale]
-    total: int
+    total: Optional[int] = None  # None cuando se omite el conteo (include_total=false)
+    next_cursor: Optional[str] = None  # Cursor opaco para pedir la siguiente página
+
+
+class SaleSummary(BaseModel):
+    """Venta sin líneas de detalle (listados tipo grid)"""
+    id: int
+    user_id: str
+    customer_id: Optional[int] = None
+    payment_method: str
+    status: str
+    subtotal: float
+    tax: float
+    discount: Optional[float] = 0.0
+    total: float
+    refunded_total: float = 0.0
+    net_total: float
+    items_count: int  # unidades vendidas (suma de cantidades)
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+
+class SaleSummaryList(BaseModel):
+    """Lista de ventas resumidas"""
+    items: list[SaleSummary]
+    total: Optional[int] = None
+    next_cursor: Optional[str] = None
 
 
 class SaleStats(BaseModel):
@@ -67,11 +115,56 @@ class SaleStats(BaseModel):
 class TodayStats(BaseModel):
     """KPIs del día para el dashboard"""
     revenue_today: float
-    products_sold_today: int
+    products_sold_today: int = Field(..., description="Unidades vendidas brutas (las devoluciones no se restan)")
     customers_today: int
     transactions_today: int
 
 
+class RegisterClosePayment(BaseModel):
+    """Ventas de un método de pago en el corte de caja"""
+    payment_method: str
+    tickets: int
+    total: float
+
+
+class RegisterCloseRefund(BaseModel):
+    """Reembolsos de un método en el corte de caja"""
+    refund_method: Optional[str] = None
+    count: int
+    total: float
+
+
+class RegisterClose(BaseModel):
+    """Corte de caja de un cajero en un rango de tiempo"""
+    user_id: str
+    date_from: Optional[datetime] = None  # UTC, inclusivo
+    date_to: datetime  # UTC, exclusivo
+    tickets: int  # ventas completadas
+    cancelled_tickets: int
+    gross_total: float
+    refunds_total: float
+    net_total: float
+    expected_cash: float  # efectivo que debe haber en caja: ventas en efectivo - reembolsos en efectivo
+    payments: list[RegisterClosePayment]
+    refunds: list[RegisterCloseRefund]
+
+
+class SalesTimeseriesPoint(BaseModel):
+    """Totales de un bucket de la serie de tiempo"""
+    start: datetime  # inicio del bucket en la zona horaria de la tienda
+    transactions: int
+    units_sold: int  # unidades brutas, como products_sold_today
+    revenue: float
+    net_revenue: float
+
+
+class SalesTimeseries(BaseModel):
+    """Serie de tiempo de ventas"""
+    bucket: str  # hour, day, week, month
+    timezone: str
+    points: list[SalesTimeseriesPoint]
+
+
 class TopProduct(BaseModel):
     product_id: int | None = None
     product_name: str
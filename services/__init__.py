@@ -0,0 +1,3 @@
+"""
+Lógica de negocio compartida entre endpoints
+"""
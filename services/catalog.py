@@ -0,0 +1,105 @@
+"""
+Servicios de versionado del catálogo: versión global, número de cambio por producto y lápidas
+"""
+import base64
+import json
+from typing import Iterable
+
+from fastapi import HTTPException, status
+from sqlalchemy import event, select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models.catalog import CatalogVersion, ProductTombstone
+from models.product import Product
+from services.product_cache import invalidate_products
+
+# Productos por sentencia al marcar cambios (las importaciones pueden tocar miles)
+BATCH_SIZE = 1000
+
+# Llave en Session.info con la versión ya tomada por la transacción en curso
+_VERSION_KEY = "catalog_version"
+
+
+def encode_change_cursor(change_seq: int, product_id: int) -> str:
+    """Cursor opaco (base64) del feed de cambios con la llave (change_seq, id) del último cambio entregado"""
+    payload = json.dumps({"s": change_seq, "i": product_id})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_change_cursor(cursor: str) -> tuple[int, int]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return int(payload["s"]), int(payload["i"])
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+
+
+async def get_catalog_version(db: AsyncSession) -> int:
+    """Versión actual (confirmada) del catálogo; 0 si nunca ha cambiado"""
+    result = await db.execute(select(CatalogVersion.version).where(CatalogVersion.id == 1))
+    return int(result.scalar() or 0)
+
+
+async def next_catalog_version(db: AsyncSession) -> int:
+    """
+    Incrementar la versión del catálogo (una sola vez por transacción) y devolverla.
+
+    El UPDATE bloquea la fila del contador hasta el commit: dos transacciones que modifican
+    el catálogo se serializan y sus versiones se confirman en orden.
+    """
+    info = db.sync_session.info
+    if _VERSION_KEY in info:
+        return info[_VERSION_KEY]
+    result = await db.execute(
+        update(CatalogVersion)
+        .where(CatalogVersion.id == 1)
+        .values(version=CatalogVersion.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        # Primera escritura del catálogo (la migración normalmente ya creó la fila)
+        db.add(CatalogVersion(id=1, version=1))
+        await db.flush()
+    info[_VERSION_KEY] = await get_catalog_version(db)
+    return info[_VERSION_KEY]
+
+
+async def record_product_changes(db: AsyncSession, product_ids: Iterable[int], deleted: bool = False):
+    """
+    Registrar que unos productos se crearon/modificaron o se eliminaron en la transacción actual.
+
+    Asigna a los productos (o a sus lápidas) la nueva versión del catálogo, de la que se alimentan
+    GET /products/changes y /products/snapshot, e invalida la caché de productos.
+    Los cambios de stock por ventas y devoluciones no pasan por aquí (solo invalidan la caché)
+    para no serializar todas las ventas en la fila del contador.
+    """
+    ids = {int(pid) for pid in product_ids if pid is not None}
+    if not ids:
+        return
+    version = await next_catalog_version(db)
+    if deleted:
+        for pid in sorted(ids):
+            await db.merge(ProductTombstone(product_id=pid, change_seq=version))
+    else:
+        ordered = sorted(ids)
+        for i in range(0, len(ordered), BATCH_SIZE):
+            batch = ordered[i:i + BATCH_SIZE]
+            await db.execute(
+                update(Product)
+                .where(Product.id.in_(batch))
+                .values(change_seq=version)
+                .execution_options(synchronize_session=False)
+            )
+            await db.execute(delete(ProductTombstone).where(ProductTombstone.product_id.in_(batch)))
+    invalidate_products(db, ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _forget_version_after_commit(session):
+    session.info.pop(_VERSION_KEY, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_version_after_rollback(session):
+    session.info.pop(_VERSION_KEY, None)
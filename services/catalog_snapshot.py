@@ -0,0 +1,99 @@
+"""
+Snapshot completo del catálogo (JSON comprimido con gzip) para terminales que arrancan en frío
+
+El snapshot se arma una vez por versión del catálogo (ver services/catalog.py) y se guarda
+comprimido en memoria; mientras la versión no cambie, cada descarga solo consulta el contador.
+"""
+import asyncio
+import gzip
+import json
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from models.product import Product
+from services.catalog import encode_change_cursor
+
+# Mismos campos que GET /products/changes (sin stock: no versiona con el catálogo)
+SNAPSHOT_COLUMNS = (
+    Product.id, Product.change_seq, Product.name, Product.description, Product.price, Product.category,
+    Product.sku, Product.barcode, Product.image_url, Product.discount_percentage, Product.has_promotion,
+    Product.promotion_start, Product.promotion_end, Product.promotion_description, Product.updated_at,
+)
+
+_snapshot: dict | None = None
+_build_lock = asyncio.Lock()
+
+
+def snapshot_etag(version: int) -> str:
+    """ETag del snapshot de una versión del catálogo (el contenido solo depende de la versión)"""
+    return f'"catalog-{version}"'
+
+
+def accepts_gzip(accept_encoding: str | None) -> bool:
+    """
+    Indica si el header Accept-Encoding admite gzip (RFC 9110, sección 12.5.3).
+
+    Se lee cada codificación con su q: gzip (o su alias x-gzip) se acepta si su q es mayor que 0;
+    si no aparece, decide el comodín `*`. Un q inválido cuenta como 0.
+    """
+    qualities: dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        coding, *params = [p.strip() for p in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding.lower()] = q
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} no es serializable")
+
+
+def _compress(payload: dict) -> bytes:
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=_json_default)
+    # mtime=0: mismos bytes para la misma versión en todos los procesos
+    return gzip.compress(raw.encode("utf-8"), compresslevel=6, mtime=0)
+
+
+async def get_catalog_snapshot(db: AsyncSession, version: int) -> dict:
+    """
+    Snapshot comprimido del catálogo para `version` (leída en la misma transacción que `db`).
+
+    Returns:
+        {"version", "etag", "body"} con body en gzip; si otro request ya armó una versión
+        más nueva se devuelve esa
+    """
+    global _snapshot
+    if _snapshot is not None and _snapshot["version"] >= version:
+        return _snapshot
+    async with _build_lock:
+        if _snapshot is not None and _snapshot["version"] >= version:
+            return _snapshot
+        result = await db.execute(select(*SNAPSHOT_COLUMNS).order_by(Product.change_seq, Product.id))
+        names = [c.key for c in SNAPSHOT_COLUMNS]
+        items = [
+            {name: value for name, value in zip(names, row) if value is not None}
+            for row in result.all()
+        ]
+        # El cursor permite continuar con /products/changes a partir del snapshot
+        cursor = encode_change_cursor(items[-1]["change_seq"], items[-1]["id"]) if items else encode_change_cursor(0, 0)
+        payload = {"version": version, "cursor": cursor, "count": len(items), "items": items}
+        body = await run_in_threadpool(_compress, payload)
+        _snapshot = {"version": version, "etag": snapshot_etag(version), "body": body}
+        return _snapshot
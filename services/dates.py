@@ -0,0 +1,128 @@
+"""
+Ventanas de fechas en la zona horaria de la tienda (settings.TIMEZONE) como rangos UTC semiabiertos
+
+Las fechas de ventas, líneas y devoluciones se guardan sin zona horaria en UTC: los endpoints
+asignan created_at = datetime.utcnow() en lugar de dejar el server_default func.now(), que en
+MySQL devuelve la hora de la zona de la sesión. Los filtros se arman como
+created_at >= inicio AND created_at < fin sobre la columna desnuda para que usen su índice.
+"""
+from datetime import date, datetime, time, timedelta, timezone
+
+from dateutil import tz
+
+from core.config import settings
+
+PERIODS = ("today", "week", "month")
+
+
+def store_tz():
+    """Zona horaria de la tienda (settings.TIMEZONE)"""
+    return tz.gettz(settings.TIMEZONE) or timezone.utc
+
+
+def sale_day(created_at: datetime | None) -> date:
+    """
+    Día local de la tienda para una fecha de venta.
+
+    Las fechas sin zona horaria se interpretan como UTC (igual que datetime.utcnow()).
+    """
+    if created_at is None:
+        created_at = datetime.utcnow()
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.astimezone(store_tz()).date()
+
+
+def to_utc(moment: datetime) -> datetime:
+    """Convertir una hora local de la tienda (o con zona explícita) a UTC sin zona, como se guarda"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=store_tz())
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def day_start(day: date) -> datetime:
+    """Medianoche local de un día, en UTC"""
+    return to_utc(datetime.combine(day, time.min))
+
+
+def day_window(start_day: date | None, end_day: date | None) -> tuple[datetime | None, datetime | None]:
+    """Rango UTC [inicio del primer día, inicio del día siguiente al último) para días locales inclusivos"""
+    start = day_start(start_day) if start_day is not None else None
+    end = day_start(end_day + timedelta(days=1)) if end_day is not None else None
+    return start, end
+
+
+def period_days(period: str, now: datetime | None = None) -> tuple[date, date]:
+    """
+    Días locales (inclusivos) de un periodo relativo a hoy.
+
+    Args:
+        period: today | week (desde el lunes) | month (desde el día 1)
+        now: Instante de referencia (por defecto ahora)
+    """
+    today = sale_day(now)
+    if period == "week":
+        return today - timedelta(days=today.weekday()), today
+    if period == "month":
+        return today.replace(day=1), today
+    return today, today
+
+
+def parse_day_range(date_from: str | None, date_to: str | None) -> tuple[date | None, date | None] | None:
+    """
+    Días locales (inclusivos) de un rango de días completos (YYYY-MM-DD).
+
+    Returns:
+        (día_inicio, día_fin), o None si alguno de los extremos trae hora
+    """
+    if any(v and len(v) > 10 for v in (date_from, date_to)):
+        return None
+    start_day = end_day = None
+    try:
+        if date_from:
+            start_day = date.fromisoformat(date_from)
+        if date_to:
+            end_day = date.fromisoformat(date_to)
+    except ValueError:
+        # Fechas inválidas se ignoran, igual que en los filtros de listado
+        pass
+    return start_day, end_day
+
+
+def parse_date_range(date_from: str | None, date_to: str | None) -> tuple[datetime | None, datetime | None]:
+    """
+    Convertir date_from/date_to del query string en un rango UTC semiabierto [inicio, fin).
+
+    - YYYY-MM-DD: días locales completos (date_to incluye todo ese día)
+    - ISO datetime: hora local de la tienda si no trae zona; date_to es el límite exclusivo
+
+    Returns:
+        (inicio, fin) en UTC sin zona; None en los extremos ausentes o inválidos
+    """
+    start_dt = None
+    end_dt = None
+    try:
+        if date_from:
+            if len(date_from) <= 10:
+                start_dt = day_start(date.fromisoformat(date_from))
+            else:
+                start_dt = to_utc(datetime.fromisoformat(date_from))
+        if date_to:
+            if len(date_to) <= 10:
+                end_dt = day_start(date.fromisoformat(date_to) + timedelta(days=1))
+            else:
+                end_dt = to_utc(datetime.fromisoformat(date_to))
+    except ValueError:
+        # Ignorar errores de formato; el extremo queda abierto
+        pass
+    return start_dt, end_dt
+
+
+def range_filters(column, start: datetime | None, end: datetime | None) -> list:
+    """Predicados column >= start AND column < end (omitiendo extremos abiertos)"""
+    filters = []
+    if start is not None:
+        filters.append(column >= start)
+    if end is not None:
+        filters.append(column < end)
+    return filters
@@ -0,0 +1,191 @@
+"""
+Servicios de exportación: lectura por bloques y generación de CSV, XLSX y NDJSON en streaming
+"""
+import csv
+import io
+import json
+import tempfile
+from datetime import datetime
+from typing import AsyncIterator, Callable, Iterable, Sequence
+
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+from starlette.concurrency import run_in_threadpool
+
+from db.session import AsyncSessionLocal
+
+# Filas por bloque leídas del cursor del servidor y escritas por chunk de respuesta
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_FORMATS = ("csv", "xlsx", "ndjson")
+
+# El XLSX se arma en un archivo temporal: en memoria hasta este tamaño, después en disco
+XLSX_SPOOL_SIZE = 8 * 1024 * 1024
+XLSX_READ_SIZE = 64 * 1024
+
+_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "ndjson": "application/x-ndjson",
+}
+
+
+async def stream_rows(stmt: Select, chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[Sequence]:
+    """
+    Recorrer el resultado de una consulta por bloques usando un cursor del lado del servidor.
+
+    Abre su propia sesión: la sesión de la dependencia get_db se cierra antes de que
+    StreamingResponse termine de enviar el cuerpo.
+
+    Yields:
+        Listas de filas (Row) de hasta chunk_size elementos
+    """
+    session = AsyncSessionLocal()
+    try:
+        result = await session.stream(stmt.execution_options(yield_per=chunk_size))
+        async for partition in result.partitions():
+            yield partition
+    finally:
+        await session.close()
+
+
+async def iter_csv(
+    header: Sequence[str],
+    chunks: AsyncIterator[Sequence],
+    to_row: Callable[[object], Iterable],
+) -> AsyncIterator[bytes]:
+    """
+    Codificar bloques de filas como CSV y emitir cada bloque en cuanto está listo.
+
+    El primer chunk lleva BOM (utf-8-sig) para que Excel detecte la codificación.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield buffer.getvalue().encode('utf-8-sig')
+    buffer.seek(0)
+    buffer.truncate(0)
+
+    async for partition in chunks:
+        writer.writerows([_csv_value(v) for v in to_row(row)] for row in partition)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate(0)
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def iter_ndjson(
+    header: Sequence[str],
+    chunks: AsyncIterator[Sequence],
+    to_row: Callable[[object], Iterable],
+) -> AsyncIterator[bytes]:
+    """Emitir un objeto JSON por línea (llaves = header), un chunk de respuesta por bloque de filas"""
+    async for partition in chunks:
+        lines = [
+            json.dumps(dict(zip(header, to_row(row))), ensure_ascii=False, default=_json_default)
+            for row in partition
+        ]
+        yield ("\n".join(lines) + "\n").encode('utf-8')
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _xlsx_value(value):
+    # openpyxl no acepta datetimes con zona horaria
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.replace(tzinfo=None)
+    return value
+
+
+async def iter_xlsx(
+    header: Sequence[str],
+    chunks: AsyncIterator[Sequence],
+    to_row: Callable[[object], Iterable],
+    sheet_title: str = "Export",
+) -> AsyncIterator[bytes]:
+    """
+    Generar un XLSX con openpyxl en modo write-only y enviarlo por bloques.
+
+    Las filas se escriben conforme llegan del cursor (openpyxl las vuelca a un temporal) y el
+    archivo comprimido se arma en un SpooledTemporaryFile, así que la memoria queda acotada
+    sin importar el número de filas. El trabajo de CPU corre en el threadpool.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_title)
+    ws.append(list(header))
+
+    def append_rows(partition):
+        for row in partition:
+            ws.append([_xlsx_value(v) for v in to_row(row)])
+
+    async for partition in chunks:
+        await run_in_threadpool(append_rows, partition)
+
+    with tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_SIZE) as out:
+        await run_in_threadpool(wb.save, out)
+        out.seek(0)
+        while True:
+            data = await run_in_threadpool(out.read, XLSX_READ_SIZE)
+            if not data:
+                break
+            yield data
+
+
+def export_response(
+    export_format: str,
+    basename: str,
+    header: Sequence[str],
+    stmt: Select,
+    to_row: Callable[[object], Iterable],
+) -> StreamingResponse:
+    """
+    Respuesta de descarga en streaming para una consulta en el formato pedido.
+
+    Args:
+        export_format: csv | xlsx | ndjson
+        basename: Prefijo del nombre de archivo (p.ej. "sales_export")
+        header: Nombres de columna (encabezado CSV/XLSX, llaves NDJSON)
+        stmt: Consulta a recorrer por bloques
+        to_row: Convierte una fila en la lista de valores (números y datetimes sin formatear)
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"format inválido; use uno de: {', '.join(EXPORT_FORMATS)}"
+        )
+    if export_format == "xlsx":
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="openpyxl es requerido para exportar xlsx"
+            )
+        body = iter_xlsx(header, stream_rows(stmt), to_row, sheet_title=basename[:31])
+    elif export_format == "ndjson":
+        body = iter_ndjson(header, stream_rows(stmt), to_row)
+    else:
+        body = iter_csv(header, stream_rows(stmt), to_row)
+
+    filename = f"{basename}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    return StreamingResponse(
+        body,
+        media_type=_MEDIA_TYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,158 @@
+"""
+Servicios de idempotencia: respuestas almacenadas para POST reintentados (header Idempotency-Key)
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from models.idempotency_key import IdempotencyKey
+
+# Cada cuántos registros nuevos se purgan las llaves expiradas de la tabla
+PURGE_EVERY = 500
+
+
+class ResponseCache:
+    """
+    Caché LRU en proceso con expiración para respuestas ya confirmadas en base de datos.
+
+    Solo se alimenta con filas leídas de la tabla (ya comprometidas), nunca con respuestas
+    de la transacción en curso, para no repetir una venta que terminó en rollback.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[tuple, tuple[float, tuple]] = OrderedDict()
+
+    def get(self, cache_key: tuple):
+        entry = self._entries.get(cache_key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[cache_key]
+            return None
+        self._entries.move_to_end(cache_key)
+        return value
+
+    def put(self, cache_key: tuple, value: tuple, ttl_seconds: float | None = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[cache_key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+_ttl = timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+response_cache = ResponseCache(settings.IDEMPOTENCY_CACHE_SIZE, _ttl.total_seconds())
+_stored_since_purge = 0
+
+
+def request_fingerprint(payload: BaseModel) -> str:
+    """Huella sha256 del cuerpo de la petición para detectar llaves reutilizadas con otro contenido"""
+    raw = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _replay(request_hash: str, stored: tuple) -> JSONResponse:
+    stored_hash, status_code, body = stored
+    if stored_hash != request_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key reutilizada con un cuerpo de petición distinto"
+        )
+    return JSONResponse(status_code=status_code, content=body, headers={"Idempotent-Replayed": "true"})
+
+
+async def replay_response(
+    db: AsyncSession, scope: str, key: str, user_id: str, request_hash: str
+) -> JSONResponse | None:
+    """
+    Buscar la respuesta almacenada de una petición con la misma llave.
+
+    Returns:
+        JSONResponse con la respuesta original, o None si la llave es nueva (o expiró)
+    """
+    cache_key = (scope, user_id, key)
+    stored = response_cache.get(cache_key)
+    if stored is not None:
+        return _replay(request_hash, stored)
+
+    result = await db.execute(
+        select(IdempotencyKey).where(
+            IdempotencyKey.key == key,
+            IdempotencyKey.scope == scope,
+            IdempotencyKey.user_id == user_id,
+        )
+    )
+    row = result.scalar_one_or_none()
+    if row is None:
+        return None
+    created_at = row.created_at.replace(tzinfo=None) if row.created_at else None
+    if created_at is not None and created_at < datetime.utcnow() - _ttl:
+        # Llave expirada: liberar para que la petición se procese como nueva
+        await db.delete(row)
+        await db.flush()
+        return None
+
+    stored = (row.request_hash, row.status_code, row.response_body)
+    remaining = _ttl.total_seconds()
+    if created_at is not None:
+        remaining -= (datetime.utcnow() - created_at).total_seconds()
+    response_cache.put(cache_key, stored, max(remaining, 0))
+    return _replay(request_hash, stored)
+
+
+async def save_response(
+    db: AsyncSession,
+    scope: str,
+    key: str,
+    user_id: str,
+    request_hash: str,
+    status_code: int,
+    body,
+):
+    """
+    Registrar la respuesta en la misma transacción que la operación.
+
+    Si otra petición con la misma llave se confirmó primero, la restricción única lo detecta
+    y se responde 409: la transacción actual (con su venta/devolución) se revierte completa.
+    """
+    global _stored_since_purge
+    db.add(IdempotencyKey(
+        key=key,
+        scope=scope,
+        user_id=user_id,
+        request_hash=request_hash,
+        status_code=status_code,
+        response_body=jsonable_encoder(body),
+        created_at=datetime.utcnow(),
+    ))
+    try:
+        await db.flush()
+    except IntegrityError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Ya se procesó una petición con esta Idempotency-Key; reintente para obtener su respuesta"
+        )
+
+    _stored_since_purge += 1
+    if _stored_since_purge >= PURGE_EVERY:
+        _stored_since_purge = 0
+        await db.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.created_at < datetime.utcnow() - _ttl)
+        )
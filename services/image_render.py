@@ -0,0 +1,40 @@
+"""
+Redimensionado de imágenes a WebP para el pool de procesos de miniaturas
+
+Este módulo se importa en los procesos del pool: solo depende de la biblioteca estándar y de Pillow.
+"""
+import os
+import uuid
+
+WEBP_QUALITY = 80
+
+
+def render_thumbnail(src_path: str, dst_path: str, size: int):
+    """Redimensionar (sin agrandar) a un lado máximo de `size` px y guardar como WebP"""
+    from PIL import Image, ImageOps
+
+    tmp_path = f"{dst_path}.{uuid.uuid4().hex}.tmp"
+    with Image.open(src_path) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        image.save(tmp_path, "WEBP", quality=WEBP_QUALITY, method=4)
+    os.replace(tmp_path, dst_path)
+
+
+def render_missing(jobs: list[tuple[str, str, int]]) -> list[str]:
+    """
+    Generar las miniaturas que aún no existan.
+
+    Args:
+        jobs: Lista de (ruta original, ruta destino, tamaño)
+
+    Returns:
+        Nombres de las miniaturas generadas
+    """
+    rendered = []
+    for src_path, dst_path, size in jobs:
+        if not os.path.exists(dst_path):
+            render_thumbnail(src_path, dst_path, size)
+            rendered.append(os.path.basename(dst_path))
+    return rendered
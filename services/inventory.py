@@ -0,0 +1,84 @@
+"""
+Servicios de inventario: reversión de ventas (eliminación/cancelación) y resolución de alertas de stock
+"""
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import select, update, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.sale import Sale
+from models.product import Product
+from models.inventory_alert import InventoryAlert
+from services.sales import get_sale_lines, remaining_lines, increment_stock, decrement_stock
+from services.rollups import record_product_lines
+
+
+async def resolve_stock_alerts(db: AsyncSession, product_ids: Iterable[int]):
+    """
+    Resolver alertas activas de stock de varios productos cuyo inventario ya es suficiente.
+
+    - no_stock: se resuelve si el stock es mayor a 0
+    - low_stock: se resuelve si el stock supera el umbral de la alerta
+
+    Son dos UPDATE en total, sin importar cuántos productos o alertas haya.
+    """
+    ids = {int(pid) for pid in product_ids if pid is not None}
+    if not ids:
+        return
+    now = datetime.utcnow()
+    await db.execute(
+        update(InventoryAlert)
+        .where(
+            InventoryAlert.product_id.in_(ids),
+            InventoryAlert.is_active == True,
+            InventoryAlert.alert_type == 'no_stock',
+            InventoryAlert.product_id.in_(select(Product.id).where(Product.id.in_(ids), Product.stock > 0)),
+        )
+        .values(is_active=False, resolved_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        update(InventoryAlert)
+        .where(
+            InventoryAlert.product_id.in_(ids),
+            InventoryAlert.is_active == True,
+            InventoryAlert.alert_type == 'low_stock',
+            InventoryAlert.threshold.is_not(None),
+            exists().where(Product.id == InventoryAlert.product_id, Product.stock > InventoryAlert.threshold),
+        )
+        .values(is_active=False, resolved_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def restore_sale_inventory(db: AsyncSession, sale: Sale) -> dict[int, dict]:
+    """
+    Revertir el efecto de una venta en inventario (eliminación o cancelación).
+
+    Regresa al stock lo vendido y no devuelto (las devoluciones ya lo repusieron) con un solo
+    UPDATE, lo descuenta del acumulado por producto y resuelve las alertas de stock que ya no aplican.
+
+    Returns:
+        Líneas revertidas {product_id: {name, quantity, unit_price, subtotal}}
+    """
+    lines = remaining_lines(sale, await get_sale_lines(db, sale.id))
+    await increment_stock(db, {pid: line["quantity"] for pid, line in lines.items()})
+    await record_product_lines(db, sale, lines, sign=-1)
+    await resolve_stock_alerts(db, lines)
+    return lines
+
+
+async def reapply_sale_inventory(db: AsyncSession, sale: Sale) -> list[int]:
+    """
+    Volver a aplicar una venta revertida (p. ej. reactivar una venta cancelada).
+
+    Returns:
+        IDs de productos sin stock suficiente; si la lista no está vacía no se registró nada
+        en el acumulado y el llamador debe abortar la transacción
+    """
+    lines = remaining_lines(sale, await get_sale_lines(db, sale.id))
+    failed = await decrement_stock(db, {pid: line["quantity"] for pid, line in lines.items()})
+    if not failed:
+        await record_product_lines(db, sale, lines)
+    return failed
@@ -0,0 +1,148 @@
+"""
+Almacenamiento de imágenes de productos: escritura por bloques fuera del event loop,
+nombres por contenido (sha256) y limpieza de archivos reemplazados
+"""
+import hashlib
+import os
+import time
+import uuid
+
+from fastapi import HTTPException, UploadFile, status
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+
+from core.media import THUMBNAIL_SIZES, product_media_url, variant_filename
+from db.session import AsyncSessionLocal
+from models.product import Product
+
+MEDIA_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "media")
+
+MAX_IMAGE_BYTES = 5 * 1024 * 1024  # 5 MB
+CHUNK_SIZE = 256 * 1024
+
+# Archivos más recientes que esto no se borran: pueden ser de una subida que aún no confirma
+GC_GRACE_SECONDS = 300
+
+_TMP_PREFIX = ".upload-"
+
+# Extensiones de las imágenes originales aceptadas
+IMAGE_EXTENSIONS = (".jpg", ".png", ".webp")
+
+
+def product_media_dir(product_id: int) -> str:
+    """Directorio de imágenes de un producto (servido en /media/products/<id>/)"""
+    return os.path.join(MEDIA_ROOT, "products", str(product_id))
+
+
+def find_original(product_id: int, stem: str) -> str | None:
+    """Nombre de archivo de la imagen original con ese nombre base, si existe"""
+    for ext in IMAGE_EXTENSIONS:
+        if os.path.isfile(os.path.join(product_media_dir(product_id), stem + ext)):
+            return stem + ext
+    return None
+
+
+def _write_chunk(out, digest, chunk: bytes):
+    digest.update(chunk)
+    out.write(chunk)
+
+
+def _publish(tmp_path: str, final_path: str):
+    if os.path.exists(final_path):
+        # Mismo contenido ya guardado: no se vuelve a escribir
+        os.remove(tmp_path)
+        os.utime(final_path)
+    else:
+        os.replace(tmp_path, final_path)
+
+
+def _discard(out, tmp_path: str):
+    out.close()
+    try:
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        pass
+
+
+async def store_product_image(product_id: int, file: UploadFile, ext: str) -> str:
+    """
+    Guardar una imagen subida leyéndola por bloques; la escritura y el sha256 corren en el threadpool.
+
+    La subida se rechaza en cuanto supera MAX_IMAGE_BYTES. El archivo se nombra con el sha256
+    del contenido, así que volver a subir la misma imagen no escribe nada nuevo.
+
+    Returns:
+        Nombre del archivo (<sha256><ext>) dentro de product_media_dir(product_id)
+    """
+    product_dir = product_media_dir(product_id)
+    await run_in_threadpool(os.makedirs, product_dir, exist_ok=True)
+    tmp_path = os.path.join(product_dir, f"{_TMP_PREFIX}{uuid.uuid4().hex}.tmp")
+    digest = hashlib.sha256()
+    size = 0
+
+    out = await run_in_threadpool(open, tmp_path, "wb")
+    try:
+        while chunk := await file.read(CHUNK_SIZE):
+            size += len(chunk)
+            if size > MAX_IMAGE_BYTES:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="La imagen excede 5MB")
+            await run_in_threadpool(_write_chunk, out, digest, chunk)
+        if size == 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="La imagen está vacía")
+    except BaseException:
+        await run_in_threadpool(_discard, out, tmp_path)
+        raise
+    await run_in_threadpool(out.close)
+
+    filename = digest.hexdigest() + ext
+    await run_in_threadpool(_publish, tmp_path, os.path.join(product_dir, filename))
+    return filename
+
+
+def _cleanup_dir(product_dir: str, keep: set[str]) -> list[str]:
+    removed = []
+    try:
+        entries = list(os.scandir(product_dir))
+    except FileNotFoundError:
+        return removed
+    cutoff = time.time() - GC_GRACE_SECONDS
+    for entry in entries:
+        if entry.name in keep or not entry.is_file() or entry.stat().st_mtime > cutoff:
+            continue
+        try:
+            os.remove(entry.path)
+            removed.append(entry.name)
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+async def gc_product_images(product_id: int) -> list[str]:
+    """
+    Borrar las imágenes de un producto que ya no usa, sus miniaturas y temporales abandonados.
+
+    Se ejecuta como tarea en segundo plano, después del commit: lee la image_url confirmada
+    con su propia sesión. Si el producto ya no existe se borra todo su directorio de imágenes.
+
+    Returns:
+        Nombres de archivos borrados
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Product.image_url).where(Product.id == product_id))
+        row = result.first()
+    keep = set()
+    if row is not None and row.image_url and row.image_url.startswith(product_media_url(product_id, "")):
+        original = row.image_url.rsplit("/", 1)[-1]
+        keep = {original, *(variant_filename(original, size) for size in THUMBNAIL_SIZES)}
+    product_dir = product_media_dir(product_id)
+    removed = await run_in_threadpool(_cleanup_dir, product_dir, keep)
+    if row is None:
+        await run_in_threadpool(_remove_empty_dir, product_dir)
+    return removed
+
+
+def _remove_empty_dir(path: str):
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
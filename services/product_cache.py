@@ -0,0 +1,143 @@
+"""
+Caché en proceso del catálogo de productos (por id, código de barras y SKU) con invalidación explícita
+"""
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from core.config import settings
+
+# Tipos de entrada de listados (get_products, search_products): cualquier escritura los descarta
+LISTING_KINDS = ("list", "search")
+
+# Llave en Session.info con los productos a invalidar otra vez al confirmar la transacción
+_PENDING_KEY = "product_cache_pending"
+
+
+class ProductCache:
+    """
+    Caché LRU con expiración para lecturas de productos.
+
+    Llaves: ("id", id), ("barcode", código), ("sku", sku) y de listados ("list", ...) / ("search", ...).
+    Cada invalidación incrementa `generation`: una lectura que empezó antes de una invalidación no
+    puede guardar su resultado, así no se re-cachean datos leídos antes de un commit.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[tuple, tuple[float, object, tuple[int, ...]]] = OrderedDict()
+        self._keys_by_product: dict[int, set[tuple]] = {}
+        self._listing_keys: set[tuple] = set()
+
+    def get(self, cache_key: tuple):
+        entry = self._entries.get(cache_key)
+        if entry is not None and entry[0] < time.monotonic():
+            self._drop(cache_key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(cache_key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, cache_key: tuple, value, generation: int, product_ids: Iterable[int] = ()):
+        """Guardar un valor leído cuando la caché estaba en `generation` (se descarta si ya cambió)"""
+        if generation != self.generation or self.max_size <= 0:
+            return
+        self._drop(cache_key)
+        product_ids = tuple(product_ids)
+        self._entries[cache_key] = (time.monotonic() + self.ttl_seconds, value, product_ids)
+        for pid in product_ids:
+            self._keys_by_product.setdefault(pid, set()).add(cache_key)
+        if cache_key[0] in LISTING_KINDS:
+            self._listing_keys.add(cache_key)
+        while len(self._entries) > self.max_size:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate(self, product_ids: Iterable[int] | None = None):
+        """Descartar las entradas de unos productos y todos los listados; sin ids, vaciar la caché"""
+        self.generation += 1
+        self.invalidations += 1
+        if product_ids is None:
+            self.clear()
+            return
+        for pid in product_ids:
+            for cache_key in list(self._keys_by_product.get(pid, ())):
+                self._drop(cache_key)
+        for cache_key in list(self._listing_keys):
+            self._drop(cache_key)
+
+    def clear(self):
+        self._entries.clear()
+        self._keys_by_product.clear()
+        self._listing_keys.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+    def _drop(self, cache_key: tuple):
+        entry = self._entries.pop(cache_key, None)
+        self._listing_keys.discard(cache_key)
+        if entry is None:
+            return
+        for pid in entry[2]:
+            keys = self._keys_by_product.get(pid)
+            if keys is not None:
+                keys.discard(cache_key)
+                if not keys:
+                    del self._keys_by_product[pid]
+
+
+product_cache = ProductCache(settings.PRODUCT_CACHE_SIZE, settings.PRODUCT_CACHE_TTL_SECONDS)
+
+
+def cache_product(product, generation: int):
+    """Guardar un producto (schema de respuesta) bajo su id, código de barras y SKU"""
+    for cache_key in (("id", product.id), ("barcode", product.barcode), ("sku", product.sku)):
+        if cache_key[1] is not None:
+            product_cache.put(cache_key, product, generation, [product.id])
+
+
+def invalidate_products(db, product_ids: Iterable[int] | None = None):
+    """
+    Invalidar productos modificados en la transacción de `db` (sin ids: todo el catálogo).
+
+    Se invalida de inmediato y otra vez al confirmar la transacción, para descartar lo que otra
+    petición haya leído (y cacheado) de la base de datos antes del commit.
+    """
+    ids = None if product_ids is None else {int(pid) for pid in product_ids if pid is not None}
+    product_cache.invalidate(ids)
+    info = getattr(db, "sync_session", db).info
+    if ids is None or info.get(_PENDING_KEY, set()) is None:
+        info[_PENDING_KEY] = None
+    else:
+        info.setdefault(_PENDING_KEY, set()).update(ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    if _PENDING_KEY in session.info:
+        product_cache.invalidate(session.info.pop(_PENDING_KEY))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
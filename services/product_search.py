@@ -0,0 +1,179 @@
+"""
+Búsqueda de productos por nombre, SKU o código de barras con índice de texto completo
+
+El backend se elige por dialecto (settings.PRODUCT_SEARCH_BACKEND = "auto"):
+- sqlite: tabla virtual FTS5 products_fts (contenido externo, mantenida con triggers)
+- mysql: índice FULLTEXT ft_products_search (name, sku, barcode) en modo BOOLEAN; los términos
+  que InnoDB no indexa (cortos o stopwords) se buscan por prefijo con LIKE 'q%'
+- otros, o si el índice aún no existe: ILIKE '%q%' (búsqueda anterior, sin índice)
+
+Cada término se busca por prefijo (type-ahead) y los resultados se ordenan por coincidencia
+exacta de SKU/código de barras, luego por relevancia y nombre.
+"""
+import re
+
+from sqlalchemy import select, case, or_, text, table, literal_column, inspect
+from sqlalchemy.dialects.mysql import match as mysql_match
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from models.product import Product
+
+# Máximo de términos que se mandan al índice (el resto de la consulta se ignora)
+MAX_TERMS = 8
+
+# innodb_ft_min_token_size por defecto: los términos más cortos no están en el índice FULLTEXT
+MYSQL_MIN_TOKEN_SIZE = 3
+
+# Stopwords por defecto de InnoDB (INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD): tampoco se indexan
+MYSQL_STOPWORDS = frozenset({
+    "a", "about", "an", "are", "as", "at", "be", "by", "com", "de", "en", "for", "from", "how",
+    "i", "in", "is", "it", "la", "of", "on", "or", "that", "the", "this", "to", "was", "what",
+    "when", "where", "who", "will", "with", "und", "www",
+})
+
+FTS_TABLE = "products_fts"
+FULLTEXT_INDEX = "ft_products_search"
+
+_SQLITE_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, sku, barcode, content='products', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON products BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, sku, barcode) VALUES (new.id, new.name, new.sku, new.barcode); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON products BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku, barcode) VALUES ('delete', old.id, old.name, old.sku, old.barcode); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, sku, barcode ON products BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku, barcode) VALUES ('delete', old.id, old.name, old.sku, old.barcode); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, sku, barcode) VALUES (new.id, new.name, new.sku, new.barcode); END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+
+# Dialectos con índice ya verificado (se consulta una vez por proceso)
+_index_ready: dict[str, bool] = {}
+
+
+def has_search_index(connection) -> bool:
+    """Indica si la base de datos ya tiene el índice de búsqueda de su dialecto"""
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        return inspect(connection).has_table(FTS_TABLE)
+    if dialect == "mysql":
+        return any(ix["name"] == FULLTEXT_INDEX for ix in inspect(connection).get_indexes("products"))
+    return False
+
+
+def ensure_search_index(connection) -> bool:
+    """
+    Crear el índice de búsqueda del dialecto si no existe (FTS5 en SQLite, FULLTEXT en MySQL).
+
+    Returns:
+        True si se creó; False si ya existía o el dialecto no tiene índice de texto completo
+    """
+    dialect = connection.dialect.name
+    if dialect not in ("sqlite", "mysql") or has_search_index(connection):
+        return False
+    if dialect == "sqlite":
+        for ddl in _SQLITE_DDL:
+            connection.execute(text(ddl))
+    else:
+        connection.execute(text(f"ALTER TABLE products ADD FULLTEXT INDEX {FULLTEXT_INDEX} (name, sku, barcode)"))
+    _index_ready.pop(dialect, None)
+    return True
+
+
+def search_terms(q: str) -> list[str]:
+    """Términos alfanuméricos de la consulta (sin operadores del motor de búsqueda)"""
+    return re.findall(r"\w+", q.lower())[:MAX_TERMS]
+
+
+async def _backend(db: AsyncSession) -> str:
+    dialect = db.bind.dialect.name
+    if settings.PRODUCT_SEARCH_BACKEND != "auto" or dialect not in ("sqlite", "mysql"):
+        return "like"
+    if dialect not in _index_ready:
+        _index_ready[dialect] = await db.run_sync(lambda session: has_search_index(session.connection()))
+    return dialect if _index_ready[dialect] else "like"
+
+
+def _fts5_query(query, q: str, terms: list[str]):
+    # Sin tope de candidatos: las coincidencias se filtran (categoría, stock) y ordenan completas
+    # y solo el LIMIT externo recorta; con un tope previo se perdían resultados filtrados
+    match = " ".join(f'"{term}"*' for term in terms)
+    candidates = (
+        select(literal_column("rowid").label("rowid"), literal_column(f"bm25({FTS_TABLE})").label("score"))
+        .select_from(table(FTS_TABLE))
+        .where(text(f"{FTS_TABLE} MATCH :match").bindparams(match=match))
+        .subquery()
+    )
+    return (
+        query.join(candidates, candidates.c.rowid == Product.id)
+        .order_by(_exact_first(q), candidates.c.score, Product.name)
+    )
+
+
+def _fulltext_query(query, q: str, terms: list[str]):
+    # `+term*` no encuentra nada si el término no está indexado (más corto que el mínimo o
+    # stopword): esos términos se buscan por prefijo con LIKE en lugar de exigirlos al índice
+    indexed = [t for t in terms if len(t) >= MYSQL_MIN_TOKEN_SIZE and t not in MYSQL_STOPWORDS]
+    query = query.where(*(_prefix_condition(t) for t in terms if t not in indexed))
+    if not indexed:
+        return query.order_by(_exact_first(q), Product.name)
+    score = mysql_match(Product.name, Product.sku, Product.barcode, against=" ".join(f"+{t}*" for t in indexed))
+    score = score.in_boolean_mode()
+    return query.where(score).order_by(_exact_first(q), score.desc(), Product.name)
+
+
+def _prefix_condition(term: str):
+    # Prefijo de cualquier palabra del nombre, o del SKU / código de barras (LIKE 'q%')
+    escaped = term.replace("_", "\\_")  # los términos son \w+: "_" es el único comodín posible
+    return or_(
+        Product.name.ilike(f"{escaped}%", escape="\\"),
+        Product.name.ilike(f"% {escaped}%", escape="\\"),
+        Product.sku.ilike(f"{escaped}%", escape="\\"),
+        Product.barcode.ilike(f"{escaped}%", escape="\\"),
+    )
+
+
+def _like_query(query, q: str, terms: list[str]):
+    search_term = f"%{q}%"
+    return query.filter(
+        (Product.name.ilike(search_term)) |
+        (Product.sku.ilike(search_term)) |
+        (Product.barcode.ilike(search_term))
+    ).order_by(_exact_first(q), Product.name)
+
+
+def _exact_first(q: str):
+    return case((or_(Product.sku == q, Product.barcode == q), 0), else_=1)
+
+
+SEARCH_BACKENDS = {
+    "sqlite": _fts5_query,
+    "mysql": _fulltext_query,
+    "like": _like_query,
+}
+
+
+async def search_products(
+    db: AsyncSession,
+    q: str | None,
+    category: str | None = None,
+    in_stock: bool = False,
+    limit: int = 50,
+) -> list[Product]:
+    """Buscar productos (términos por prefijo, ordenados por relevancia) con filtros de categoría y stock"""
+    query = select(Product)
+    if category:
+        query = query.filter(Product.category == category)
+    if in_stock:
+        query = query.filter(Product.stock > 0)
+
+    q = (q or "").strip()
+    if q:
+        terms = search_terms(q)
+        backend = await _backend(db) if terms else "like"
+        query = SEARCH_BACKENDS[backend](query, q, terms)
+
+    result = await db.execute(query.limit(limit))
+    return list(result.scalars().all())
@@ -0,0 +1,273 @@
+"""
+Servicios de acumulados diarios de ventas (daily_sales_rollup y product_daily_sales)
+"""
+from datetime import date
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.sale import Sale
+from models.daily_sales_rollup import DailySalesRollup
+from models.product_daily_sales import ProductDailySales
+from services.sales import sale_item_rows
+from services.dates import sale_day
+
+_ROLLUP_KEY = ["day", "payment_method", "user_id", "status"]
+_ROLLUP_COUNTERS = ["transactions", "units_sold", "revenue", "net_revenue"]
+_PRODUCT_KEY = ["day", "product_id"]
+_PRODUCT_COUNTERS = ["quantity", "revenue"]
+
+
+def sale_units(items) -> int:
+    """Sumar las cantidades de los items JSON de una venta"""
+    units = 0
+    try:
+        for it in items or []:
+            qty = it.get('quantity', 0) if isinstance(it, dict) else 0
+            units += int(qty or 0)
+    except Exception:
+        pass
+    return units
+
+
+def _insert_for(dialect: str):
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+async def _apply_delta(
+    db: AsyncSession,
+    day: date,
+    payment_method: str,
+    user_id: str,
+    status: str,
+    transactions: int = 0,
+    units_sold: int = 0,
+    revenue: float = 0.0,
+    net_revenue: float = 0.0,
+):
+    """Sumar (o restar, con valores negativos) contadores a una fila del acumulado con un solo UPSERT."""
+    dialect = db.bind.dialect.name
+    insert = _insert_for(dialect)
+    stmt = insert(DailySalesRollup).values(
+        day=day,
+        payment_method=payment_method,
+        user_id=user_id,
+        status=status,
+        transactions=transactions,
+        units_sold=units_sold,
+        revenue=revenue,
+        net_revenue=net_revenue,
+    )
+    table = DailySalesRollup.__table__
+    if dialect == "mysql":
+        stmt = stmt.on_duplicate_key_update(
+            {c: table.c[c] + stmt.inserted[c] for c in _ROLLUP_COUNTERS}
+        )
+    else:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=_ROLLUP_KEY,
+            set_={c: table.c[c] + stmt.excluded[c] for c in _ROLLUP_COUNTERS},
+        )
+    await db.execute(stmt)
+
+
+async def record_sale(
+    db: AsyncSession,
+    sale: Sale,
+    refunded: float = 0.0,
+    sign: int = 1,
+    status: str | None = None,
+):
+    """
+    Agregar una venta a su fila del acumulado (sign=-1 la retira).
+
+    Args:
+        db: Sesión de base de datos
+        sale: Venta ya persistida (con created_at)
+        refunded: Reembolsos completados de la venta (afecta net_revenue)
+        sign: 1 para sumar, -1 para restar
+        status: Estado de la fila a afectar (por defecto sale.status)
+    """
+    total = float(sale.total or 0.0)
+    await _apply_delta(
+        db,
+        sale_day(sale.created_at),
+        sale.payment_method,
+        sale.user_id,
+        status or sale.status,
+        transactions=sign,
+        units_sold=sign * sale_units(sale.items),
+        revenue=sign * total,
+        net_revenue=sign * (total - float(refunded or 0.0)),
+    )
+
+
+async def record_sales(db: AsyncSession, sales) -> None:
+    """Agregar varias ventas nuevas al acumulado con un UPSERT por fila afectada (no por venta)"""
+    deltas: dict[tuple, dict] = {}
+    for sale in sales:
+        key = (sale_day(sale.created_at), sale.payment_method, sale.user_id, sale.status)
+        d = deltas.setdefault(key, {"transactions": 0, "units_sold": 0, "revenue": 0.0, "net_revenue": 0.0})
+        total = float(sale.total or 0.0)
+        d["transactions"] += 1
+        d["units_sold"] += sale_units(sale.items)
+        d["revenue"] += total
+        d["net_revenue"] += total
+    for key, counters in deltas.items():
+        await _apply_delta(db, *key, **counters)
+
+
+async def record_status_change(db: AsyncSession, sale: Sale, old_status: str, refunded: float = 0.0):
+    """Mover una venta de la fila de old_status a la de su estado actual"""
+    if old_status == sale.status:
+        return
+    await record_sale(db, sale, refunded, sign=-1, status=old_status)
+    await record_sale(db, sale, refunded)
+
+
+async def record_refund(db: AsyncSession, sale: Sale, amount: float):
+    """
+    Descontar un reembolso del ingreso neto del día de la venta.
+
+    units_sold no cambia: son unidades brutas, igual que revenue (las unidades devueltas
+    se descuentan solo en product_daily_sales, que alimenta el top de productos).
+    """
+    if not amount:
+        return
+    await _apply_delta(
+        db,
+        sale_day(sale.created_at),
+        sale.payment_method,
+        sale.user_id,
+        sale.status,
+        net_revenue=-float(amount),
+    )
+
+
+async def get_rollup_totals(db: AsyncSession, start_day: date | None = None, end_day: date | None = None) -> dict:
+    """
+    Totales del acumulado entre dos días locales (inclusivos), sin ventas canceladas.
+
+    Las canceladas se revierten en inventario y en product_daily_sales, así que tampoco cuentan aquí.
+
+    Returns:
+        Diccionario con transactions, units_sold (brutas), revenue y net_revenue
+    """
+    filters = [DailySalesRollup.status != "cancelled"]
+    if start_day is not None:
+        filters.append(DailySalesRollup.day >= start_day)
+    if end_day is not None:
+        filters.append(DailySalesRollup.day <= end_day)
+    result = await db.execute(
+        select(
+            func.coalesce(func.sum(DailySalesRollup.transactions), 0),
+            func.coalesce(func.sum(DailySalesRollup.units_sold), 0),
+            func.coalesce(func.sum(DailySalesRollup.revenue), 0.0),
+            func.coalesce(func.sum(DailySalesRollup.net_revenue), 0.0),
+        ).where(*filters)
+    )
+    transactions, units_sold, revenue, net_revenue = result.one()
+    return {
+        "transactions": int(transactions or 0),
+        "units_sold": int(units_sold or 0),
+        "revenue": float(revenue or 0.0),
+        "net_revenue": float(net_revenue or 0.0),
+    }
+
+
+async def _apply_product_deltas(db: AsyncSession, deltas: dict[tuple, dict]):
+    """
+    Sumar contadores a varias filas de product_daily_sales con un solo UPSERT multi-fila.
+
+    Las filas se envían ordenadas por llave para que transacciones concurrentes bloqueen en el mismo orden.
+    """
+    if not deltas:
+        return
+    dialect = db.bind.dialect.name
+    insert = _insert_for(dialect)
+    values = [
+        {"day": day, "product_id": product_id, **counters}
+        for (day, product_id), counters in sorted(deltas.items())
+    ]
+    stmt = insert(ProductDailySales).values(values)
+    table = ProductDailySales.__table__
+    if dialect == "mysql":
+        updates = {c: table.c[c] + stmt.inserted[c] for c in _PRODUCT_COUNTERS}
+        updates["product_name"] = stmt.inserted.product_name
+        stmt = stmt.on_duplicate_key_update(updates)
+    else:
+        updates = {c: table.c[c] + stmt.excluded[c] for c in _PRODUCT_COUNTERS}
+        updates["product_name"] = stmt.excluded.product_name
+        stmt = stmt.on_conflict_do_update(index_elements=_PRODUCT_KEY, set_=updates)
+    await db.execute(stmt)
+
+
+async def record_product_sales(db: AsyncSession, sales) -> None:
+    """Agregar las líneas de una o varias ventas nuevas a product_daily_sales"""
+    deltas: dict[tuple, dict] = {}
+    for sale in sales:
+        day = sale_day(sale.created_at)
+        for row in sale_item_rows(sale):
+            d = deltas.setdefault((day, row["product_id"]), {"product_name": row["product_name"], "quantity": 0, "revenue": 0.0})
+            d["product_name"] = row["product_name"]
+            d["quantity"] += row["quantity"]
+            d["revenue"] += row["subtotal"]
+    await _apply_product_deltas(db, deltas)
+
+
+async def record_product_lines(db: AsyncSession, sale: Sale, lines: dict[int, dict], sign: int = 1):
+    """
+    Sumar (o restar con sign=-1) líneas de una venta en product_daily_sales, en el día de la venta.
+
+    Args:
+        db: Sesión de base de datos
+        sale: Venta a la que pertenecen las líneas
+        lines: {product_id: {name, quantity, subtotal}} (formato de get_sale_lines)
+        sign: 1 para sumar, -1 para restar (devoluciones y eliminaciones)
+    """
+    day = sale_day(sale.created_at)
+    deltas = {
+        (day, product_id): {
+            "product_name": line["name"],
+            "quantity": sign * int(line["quantity"]),
+            "revenue": sign * float(line["subtotal"]),
+        }
+        for product_id, line in lines.items()
+        if line["quantity"]
+    }
+    await _apply_product_deltas(db, deltas)
+
+
+async def get_rollup_top_products(db: AsyncSession, start_day: date | None = None, end_day: date | None = None, limit: int = 5):
+    """
+    Productos con más unidades vendidas entre dos días locales (inclusivos), desde product_daily_sales.
+
+    Returns:
+        Lista de filas (product_id, product_name, quantity, revenue)
+    """
+    filters = []
+    if start_day is not None:
+        filters.append(ProductDailySales.day >= start_day)
+    if end_day is not None:
+        filters.append(ProductDailySales.day <= end_day)
+    total_quantity = func.sum(ProductDailySales.quantity)
+    total_revenue = func.sum(ProductDailySales.revenue)
+    result = await db.execute(
+        select(
+            ProductDailySales.product_id,
+            func.max(ProductDailySales.product_name),
+            total_quantity,
+            total_revenue,
+        )
+        .where(*filters)
+        .group_by(ProductDailySales.product_id)
+        .having(total_quantity > 0)
+        .order_by(total_quantity.desc(), total_revenue.desc())
+        .limit(limit)
+    )
+    return result.all()
@@ -0,0 +1,209 @@
+"""
+Servicios de ventas: cálculo de totales netos, líneas de venta y descuento de inventario
+"""
+from typing import Iterable, Sequence
+from sqlalchemy import select, insert, update, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.sale import Sale
+from models.sale_item import SaleItem
+from models.product import Product
+from services.product_cache import invalidate_products
+
+
+def attach_net_totals(sales: Sequence[Sale]) -> Sequence[Sale]:
+    """
+    Asignar net_total (total - reembolsos completados) a un lote de ventas.
+
+    Usa la columna desnormalizada refunded_total, sin consultar devoluciones.
+    El atributo se agrega dinámicamente para que los schemas con from_attributes lo serialicen.
+    """
+    for s in sales:
+        setattr(s, 'net_total', float(s.total) - float(s.refunded_total or 0.0))
+    return sales
+
+
+def returned_quantities(sale: Sale) -> dict[int, int]:
+    """Cantidades ya devueltas por product_id según el mapa JSON de la venta"""
+    quantities: dict[int, int] = {}
+    for pid, qty in (sale.returned_quantities or {}).items():
+        try:
+            quantities[int(pid)] = int(qty or 0)
+        except (TypeError, ValueError):
+            continue
+    return quantities
+
+
+def apply_return(sale: Sale, quantities: dict[int, int], refund: float):
+    """
+    Sumar una devolución a los acumulados de la venta (refunded_total y returned_quantities).
+
+    La venta debe haberse leído con SELECT ... FOR UPDATE para que dos devoluciones
+    simultáneas de la misma venta no se pisen los acumulados.
+    """
+    returned = returned_quantities(sale)
+    for pid, qty in quantities.items():
+        returned[pid] = returned.get(pid, 0) + int(qty)
+    # Se asigna un dict nuevo para que SQLAlchemy detecte el cambio en la columna JSON
+    sale.returned_quantities = {str(pid): qty for pid, qty in returned.items()}
+    sale.refunded_total = round(float(sale.refunded_total or 0.0) + float(refund or 0.0), 2)
+
+
+def sale_item_rows(sale: Sale) -> list[dict]:
+    """Convertir los items JSON de una venta en filas para sale_items (ignora entradas inválidas)"""
+    rows = []
+    for it in sale.items or []:
+        if not isinstance(it, dict) or it.get('product_id') is None:
+            continue
+        try:
+            rows.append({
+                "sale_id": sale.id,
+                "product_id": int(it.get('product_id')),
+                "product_name": str(it.get('product_name') or 'Producto'),
+                "quantity": int(it.get('quantity') or 0),
+                "unit_price": float(it.get('unit_price') or 0.0),
+                "subtotal": float(it.get('subtotal') or 0.0),
+                "created_at": sale.created_at,
+            })
+        except (TypeError, ValueError):
+            continue
+    return rows
+
+
+async def record_sale_items(db: AsyncSession, *sales: Sale):
+    """Insertar las líneas de una o varias ventas en sale_items con un solo INSERT (misma transacción)"""
+    rows = [row for sale in sales for row in sale_item_rows(sale)]
+    if rows:
+        await db.execute(insert(SaleItem), rows)
+
+
+async def get_sale_lines(db: AsyncSession, sale_id: int) -> dict[int, dict]:
+    """
+    Líneas de una venta agrupadas por producto, leídas del índice de sale_items.
+
+    Returns:
+        Diccionario {product_id: {name, quantity, unit_price, subtotal}}
+    """
+    result = await db.execute(
+        select(SaleItem).where(SaleItem.sale_id == sale_id).order_by(SaleItem.id)
+    )
+    lines: dict[int, dict] = {}
+    for it in result.scalars().all():
+        line = lines.setdefault(it.product_id, {"name": it.product_name, "quantity": 0, "unit_price": it.unit_price, "subtotal": 0.0})
+        line["quantity"] += int(it.quantity or 0)
+        line["subtotal"] += float(it.subtotal or 0.0)
+        line["unit_price"] = float(it.unit_price or 0.0)
+    return lines
+
+
+def remaining_lines(sale: Sale, lines: dict[int, dict]) -> dict[int, dict]:
+    """Líneas de la venta descontando lo ya devuelto (cantidad y subtotal a precio unitario de venta)"""
+    returned = returned_quantities(sale)
+    remaining = {}
+    for product_id, line in lines.items():
+        quantity = line["quantity"] - returned.get(product_id, 0)
+        if quantity > 0:
+            remaining[product_id] = {
+                **line,
+                "quantity": quantity,
+                "subtotal": line["subtotal"] - returned.get(product_id, 0) * line["unit_price"],
+            }
+    return remaining
+
+
+async def returned_line_totals(db: AsyncSession, filters: list) -> dict[int, dict]:
+    """
+    Unidades devueltas por producto en las ventas que cumplen `filters` (predicados sobre Sale).
+
+    El importe se calcula a precio unitario de venta, igual que al descontar una devolución
+    de product_daily_sales (ver api/v1/returns.py).
+
+    Returns:
+        Diccionario {product_id: {quantity, subtotal}}
+    """
+    result = await db.execute(
+        select(Sale.id, Sale.returned_quantities).where(*filters, Sale.returned_quantities.is_not(None))
+    )
+    returned = {row.id: returned_quantities(row) for row in result.all()}
+    returned = {sale_id: quantities for sale_id, quantities in returned.items() if quantities}
+    if not returned:
+        return {}
+
+    result = await db.execute(
+        select(SaleItem.sale_id, SaleItem.product_id, SaleItem.unit_price)
+        .where(SaleItem.sale_id.in_(returned))
+        .order_by(SaleItem.id)
+    )
+    # El último precio unitario de cada producto en la venta, como en get_sale_lines
+    unit_prices = {(row.sale_id, row.product_id): float(row.unit_price or 0.0) for row in result.all()}
+
+    totals: dict[int, dict] = {}
+    for sale_id, quantities in returned.items():
+        for product_id, quantity in quantities.items():
+            line = totals.setdefault(product_id, {"quantity": 0, "subtotal": 0.0})
+            line["quantity"] += quantity
+            line["subtotal"] += quantity * unit_prices.get((sale_id, product_id), 0.0)
+    return totals
+
+
+def aggregate_quantities(items: Iterable) -> dict[int, int]:
+    """Sumar cantidades por product_id (un ticket puede repetir el mismo producto en varias líneas)"""
+    quantities: dict[int, int] = {}
+    for item in items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + int(item.quantity)
+    return quantities
+
+
+async def load_stock(db: AsyncSession, product_ids: Iterable[int]) -> dict[int, object]:
+    """
+    Cargar id, nombre y stock de varios productos con una sola consulta IN.
+
+    Se leen columnas (no entidades) para no dejar objetos con stock desactualizado en la sesión.
+    """
+    ids = set(product_ids)
+    if not ids:
+        return {}
+    result = await db.execute(
+        select(Product.id, Product.name, Product.stock).where(Product.id.in_(ids))
+    )
+    return {row.id: row for row in result.all()}
+
+
+async def decrement_stock(db: AsyncSession, quantities: dict[int, int]) -> list[int]:
+    """
+    Descontar inventario con UPDATE condicionales (stock = stock - q WHERE stock >= q).
+
+    La condición se evalúa en la base de datos, así que dos ventas simultáneas no pueden
+    vender la misma última unidad. Los productos se actualizan en orden de id para que
+    transacciones concurrentes tomen los bloqueos en el mismo orden.
+
+    Returns:
+        IDs de productos cuyo UPDATE no afectó filas (stock insuficiente o inexistente)
+    """
+    failed = []
+    for product_id in sorted(quantities):
+        quantity = quantities[product_id]
+        result = await db.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.stock >= quantity)
+            .values(stock=Product.stock - quantity)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            failed.append(product_id)
+    invalidate_products(db, quantities)
+    return failed
+
+
+async def increment_stock(db: AsyncSession, quantities: dict[int, int]):
+    """Sumar inventario a varios productos con un solo UPDATE (stock = stock + CASE id ...)"""
+    quantities = {pid: int(q) for pid, q in quantities.items() if pid is not None and q}
+    if not quantities:
+        return
+    await db.execute(
+        update(Product)
+        .where(Product.id.in_(quantities))
+        .values(stock=Product.stock + case(quantities, value=Product.id, else_=0))
+        .execution_options(synchronize_session=False)
+    )
+    invalidate_products(db, quantities)
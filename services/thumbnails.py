@@ -0,0 +1,70 @@
+"""
+Miniaturas WebP de imágenes de productos, generadas en un pool de procesos
+
+Cada imagen original media/products/<id>/<sha256>.<ext> tiene variantes <sha256>_<px>.webp
+en el mismo directorio. Se generan en segundo plano al subir la imagen y, si falta alguna,
+al pedirla (GET /products/{id}/thumbnails/{nombre}). Requiere Pillow; sin Pillow se sirve
+la imagen original.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from core.config import settings
+from core.media import THUMBNAIL_SIZES, variant_filename
+from services.image_render import render_missing
+from services.media import product_media_dir
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def thumbnails_available() -> bool:
+    """Indica si Pillow está instalado"""
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: no heredar por fork los hilos y conexiones del proceso del servidor
+        _pool = ProcessPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _jobs(product_id: int, original: str, sizes) -> list[tuple[str, str, int]]:
+    product_dir = product_media_dir(product_id)
+    src_path = os.path.join(product_dir, original)
+    return [(src_path, os.path.join(product_dir, variant_filename(original, size)), size) for size in sizes]
+
+
+async def generate_thumbnails(product_id: int, original: str) -> list[str]:
+    """
+    Generar las miniaturas faltantes de una imagen (tarea en segundo plano tras la subida).
+
+    Un error aquí no afecta la subida: la miniatura se vuelve a intentar cuando se pida.
+
+    Returns:
+        Nombres de las miniaturas generadas
+    """
+    if not thumbnails_available():
+        return []
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_pool(), render_missing, _jobs(product_id, original, THUMBNAIL_SIZES))
+    except Exception:
+        return []
+
+
+async def ensure_thumbnail(product_id: int, original: str, size: int) -> str:
+    """Ruta de la miniatura de `size` px de una imagen, generándola en el pool si aún no existe"""
+    jobs = _jobs(product_id, original, (size,))
+    path = jobs[0][1]
+    if not os.path.exists(path):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(_get_pool(), render_missing, jobs)
+    return path
@@ -0,0 +1,169 @@
+"""
+Servicios de series de tiempo de ventas: agrupación por grupos UTC en SQL y plegado a buckets locales
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+from sqlalchemy import func, cast, Integer, Text, literal_column
+
+from services.dates import store_tz
+
+BUCKETS = ("hour", "day", "week", "month")
+
+# Máximo de puntos por serie (evita respuestas gigantes con bucket=hour en rangos largos)
+MAX_POINTS = 2000
+
+# Minutos del grupo más fino: las zonas con offset de :30 o :45 (p. ej. Asia/Kolkata,
+# Asia/Kathmandu) cortan sus horas y días locales en un múltiplo de 15 minutos UTC
+SLOT_MINUTES = 15
+
+# Granularidades de grupo, de la más gruesa a la más fina
+SLOTS = ("day", "hour", "quarter")
+
+_SLOT_FORMAT = "%Y-%m-%d %H:%M"
+
+
+def slot_plan(bucket: str, start_dt: datetime, end_dt: datetime) -> tuple[str, int]:
+    """
+    Grupo SQL más grueso que sigue cayendo completo en un solo bucket local.
+
+    - day: días locales (UTC desplazado por el offset), si el offset de la tienda no cambia en
+      el rango y el bucket es day/week/month; un año mensual son ~365 grupos en vez de ~35k
+    - hour: horas UTC, si todos los offsets del rango son horas completas (con horario de verano)
+    - quarter: cuartos de hora UTC, para zonas con offset de :30 o :45
+
+    Returns:
+        (granularidad, desplazamiento en minutos que se suma a la columna; solo aplica a day)
+    """
+    offsets = _offsets(start_dt, end_dt)
+    if bucket != "hour" and len(offsets) == 1:
+        return "day", next(iter(offsets))
+    if all(offset % 60 == 0 for offset in offsets):
+        return "hour", 0
+    return "quarter", 0
+
+
+def _offsets(start_dt: datetime, end_dt: datetime) -> set[int]:
+    # Offsets (minutos) de la tienda en el rango, muestreados cada día (los cambios de horario
+    # están separados por meses) y al final del rango
+    tz = store_tz()
+    start = start_dt if start_dt.tzinfo else start_dt.replace(tzinfo=timezone.utc)
+    end = end_dt if end_dt.tzinfo else end_dt.replace(tzinfo=timezone.utc)
+    moments = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    moments.append(end - timedelta(microseconds=1))
+    return {int(m.astimezone(tz).utcoffset().total_seconds() // 60) for m in moments if m < end}
+
+
+def utc_slot_key(column, dialect: str, slot: str = "quarter", shift_minutes: int = 0):
+    """
+    Expresión SQL con el inicio (texto 'YYYY-MM-DD HH:MM') del grupo de una columna datetime.
+
+    Se agrupa en SQL y los buckets locales se arman en Python: así la conversión de zona horaria
+    (incluido horario de verano) no depende de las tablas de zonas del servidor. Los grupos hour y
+    quarter son UTC; el grupo day es el día de `column + shift_minutes` (ver slot_plan).
+    """
+    if slot == "day":
+        if dialect == "mysql":
+            shifted = func.timestampadd(literal_column("MINUTE"), shift_minutes, column)
+            return func.date_format(shifted, "%Y-%m-%d 00:00")
+        if dialect == "postgresql":
+            return func.to_char(column + timedelta(minutes=shift_minutes), "YYYY-MM-DD 00:00", type_=Text)
+        return func.strftime("%Y-%m-%d 00:00", column, f"{shift_minutes:+d} minutes", type_=Text)
+    if slot == "hour":
+        if dialect == "mysql":
+            return func.date_format(column, "%Y-%m-%d %H:00")
+        if dialect == "postgresql":
+            return func.to_char(column, "YYYY-MM-DD HH24:00", type_=Text)
+        return func.strftime("%Y-%m-%d %H:00", column, type_=Text)
+    if dialect == "mysql":
+        minute = func.lpad(func.minute(column) // SLOT_MINUTES * SLOT_MINUTES, 2, "0")
+        return func.concat(func.date_format(column, "%Y-%m-%d %H:"), minute)
+    if dialect == "postgresql":
+        minute = cast(func.extract("minute", column), Integer) // SLOT_MINUTES * SLOT_MINUTES
+        return func.to_char(column, "YYYY-MM-DD HH24:", type_=Text).concat(func.lpad(cast(minute, Text), 2, "0"))
+    minute = cast(func.strftime("%M", column), Integer) // SLOT_MINUTES * SLOT_MINUTES
+    return func.strftime("%Y-%m-%d %H:", column, type_=Text).concat(func.printf("%02d", minute))
+
+
+def bucket_start(moment: datetime, bucket: str) -> datetime:
+    """Inicio (hora local de la tienda, con zona) del bucket que contiene un instante"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    local = moment.astimezone(store_tz())
+    if bucket == "hour":
+        return local.replace(minute=0, second=0, microsecond=0)
+    start = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == "week":
+        start = start - timedelta(days=start.weekday())
+    elif bucket == "month":
+        start = start.replace(day=1)
+    # Recalcular el offset para la nueva hora de pared (puede cruzar un cambio de horario)
+    return start.replace(tzinfo=None).replace(tzinfo=store_tz())
+
+
+def next_bucket(start: datetime, bucket: str) -> datetime:
+    """Inicio del bucket siguiente"""
+    if bucket == "hour":
+        return (start.astimezone(timezone.utc) + timedelta(hours=1)).astimezone(store_tz())
+    if bucket == "day":
+        nxt = start + timedelta(days=1)
+    elif bucket == "week":
+        nxt = start + timedelta(days=7)
+    else:
+        nxt = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return nxt.replace(tzinfo=None).replace(tzinfo=store_tz())
+
+
+def _last_bucket(end_dt: datetime, bucket: str) -> datetime:
+    # end_dt es exclusivo: el último bucket es el que contiene el instante anterior
+    return bucket_start(end_dt - timedelta(microseconds=1), bucket)
+
+
+def count_buckets(start_dt: datetime, end_dt: datetime, bucket: str) -> int:
+    """Número de buckets del rango [start_dt, end_dt)"""
+    count = 0
+    current = bucket_start(start_dt, bucket)
+    last = _last_bucket(end_dt, bucket)
+    while current <= last and count <= MAX_POINTS:
+        count += 1
+        current = next_bucket(current, bucket)
+    return count
+
+
+def fold_slots(
+    rows: Iterable, bucket: str, start_dt: datetime, end_dt: datetime, shift_minutes: int = 0
+) -> list[dict]:
+    """
+    Plegar filas agrupadas por utc_slot_key en buckets locales contiguos (los vacíos van en cero).
+
+    Args:
+        rows: Filas (grupo, transactions, units_sold, revenue, net_revenue)
+        bucket: hour | day | week | month
+        start_dt: Inicio del rango (UTC)
+        end_dt: Fin exclusivo del rango (UTC)
+        shift_minutes: Desplazamiento con que se agrupó (grupos day); se resta para volver a UTC
+
+    Returns:
+        Lista de puntos {start, transactions, units_sold, revenue, net_revenue} ordenada por start
+    """
+    points: dict[datetime, dict] = {}
+    current = bucket_start(start_dt, bucket)
+    last = _last_bucket(end_dt, bucket)
+    while current <= last:
+        points[current] = {"start": current, "transactions": 0, "units_sold": 0, "revenue": 0.0, "net_revenue": 0.0}
+        current = next_bucket(current, bucket)
+
+    for slot, transactions, units_sold, revenue, net_revenue in rows:
+        if slot is None:
+            continue
+        moment = datetime.strptime(slot, _SLOT_FORMAT) - timedelta(minutes=shift_minutes)
+        moment = moment.replace(tzinfo=timezone.utc)
+        point = points.get(bucket_start(moment, bucket))
+        if point is None:
+            continue
+        point["transactions"] += int(transactions or 0)
+        point["units_sold"] += int(units_sold or 0)
+        point["revenue"] += float(revenue or 0.0)
+        point["net_revenue"] += float(net_revenue or 0.0)
+
+    return list(points.values())
@@ -0,0 +1,118 @@
+"""
+Test de concurrencia: varias cajas venden las últimas unidades de un producto al mismo tiempo.
+Solo deben confirmarse tantas ventas como unidades había en stock y el stock nunca debe quedar negativo.
+"""
+import requests
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = "http://localhost:8000/api/v1"
+
+# Unidades disponibles y cajas compitiendo por ellas
+STOCK_INICIAL = 3
+CAJAS = 10
+
+
+def login():
+    """Autenticar y obtener token"""
+    response = requests.post(
+        f"{BASE_URL}/auth/login",
+        data={
+            "username": "admin",
+            "password": "admin123"
+        }
+    )
+    return response.json()["access_token"]
+
+
+def get_headers(token):
+    """Obtener headers con token"""
+    return {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    }
+
+
+def sell_one(headers, product):
+    """Intentar vender 1 unidad del producto; regresa el código HTTP"""
+    sale_data = {
+        "items": [{
+            "product_id": product["id"],
+            "product_name": product["name"],
+            "quantity": 1,
+            "unit_price": product["price"],
+            "subtotal": product["price"]
+        }],
+        "subtotal": product["price"],
+        "tax": 0.0,
+        "discount": 0.0,
+        "total": product["price"],
+        "payment_method": "cash"
+    }
+    response = requests.post(f"{BASE_URL}/sales/", headers=headers, json=sale_data)
+    return response.status_code, response.json()
+
+
+def test_concurrent_last_units():
+    """Test principal: ventas simultáneas de las últimas unidades"""
+    print("\n" + "="*70)
+    print("TEST: VENTAS CONCURRENTES DE LAS ÚLTIMAS UNIDADES")
+    print("="*70)
+
+    # 1. Autenticarse
+    print("\n1️⃣ Autenticando...")
+    token = login()
+    headers = get_headers(token)
+    print("✅ Token obtenido")
+
+    # 2. Crear producto de prueba con stock limitado
+    print(f"\n2️⃣ Creando producto de prueba con stock {STOCK_INICIAL}...")
+    stamp = datetime.now().timestamp()
+    response = requests.post(
+        f"{BASE_URL}/products",
+        headers=headers,
+        json={
+            "name": "Producto Test Concurrencia",
+            "price": 10.0,
+            "stock": STOCK_INICIAL,
+            "category": "Test",
+            "sku": f"TEST-CONC-{stamp}",
+            "barcode": f"CONC{stamp}"
+        }
+    )
+    product = response.json()
+    print(f"✅ Producto creado (ID: {product['id']})")
+
+    # 3. Lanzar ventas simultáneas
+    print(f"\n3️⃣ Lanzando {CAJAS} ventas simultáneas de 1 unidad...")
+    with ThreadPoolExecutor(max_workers=CAJAS) as pool:
+        results = list(pool.map(lambda _: sell_one(headers, product), range(CAJAS)))
+
+    created = [body for code, body in results if code == 201]
+    rejected = [body for code, body in results if code == 400]
+    print(f"   Ventas confirmadas: {len(created)}")
+    print(f"   Ventas rechazadas por stock: {len(rejected)}")
+
+    # 4. Verificar stock final
+    response = requests.get(f"{BASE_URL}/products/{product['id']}", headers=headers)
+    final_stock = response.json()["stock"]
+    print(f"\n4️⃣ Stock final: {final_stock}")
+
+    ok = len(created) == STOCK_INICIAL and final_stock == 0 and len(rejected) == CAJAS - STOCK_INICIAL
+    if ok:
+        print("✅ Sin sobreventa: se vendieron exactamente las unidades disponibles")
+    else:
+        print("❌ Resultado inconsistente con el stock disponible")
+
+    # Limpiar: eliminar ventas y producto de prueba
+    print("\n   🧹 Limpiando...")
+    for sale in created:
+        requests.delete(f"{BASE_URL}/sales/{sale['id']}", headers=headers)
+    requests.delete(f"{BASE_URL}/products/{product['id']}", headers=headers)
+    print("   ✅ Datos de prueba eliminados")
+
+    assert ok
+
+
+if __name__ == "__main__":
+    test_concurrent_last_units()
@@ -0,0 +1,167 @@
+"""
+Test de idempotencia de POST /sales/ con el header Idempotency-Key.
+Un reintento (secuencial o simultáneo) con la misma llave debe registrar una sola venta
+y descontar el stock una sola vez; la misma llave con otro cuerpo se rechaza con 422.
+"""
+import requests
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = "http://localhost:8000/api/v1"
+
+# Reintentos simultáneos con la misma llave
+REINTENTOS = 8
+STOCK_INICIAL = 20
+
+
+def login():
+    """Autenticar y obtener token"""
+    response = requests.post(
+        f"{BASE_URL}/auth/login",
+        data={
+            "username": "admin",
+            "password": "admin123"
+        }
+    )
+    return response.json()["access_token"]
+
+
+def get_headers(token):
+    """Obtener headers con token"""
+    return {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    }
+
+
+def sale_payload(product, quantity):
+    """Venta de `quantity` unidades del producto"""
+    subtotal = product["price"] * quantity
+    return {
+        "items": [{
+            "product_id": product["id"],
+            "product_name": product["name"],
+            "quantity": quantity,
+            "unit_price": product["price"],
+            "subtotal": subtotal
+        }],
+        "subtotal": subtotal,
+        "tax": 0.0,
+        "discount": 0.0,
+        "total": subtotal,
+        "payment_method": "cash"
+    }
+
+
+def post_sale(headers, key, payload):
+    """Enviar la venta con Idempotency-Key; regresa la respuesta"""
+    return requests.post(f"{BASE_URL}/sales/", headers={**headers, "Idempotency-Key": key}, json=payload)
+
+
+def get_stock(headers, product):
+    response = requests.get(f"{BASE_URL}/products/{product['id']}", headers=headers)
+    return response.json()["stock"]
+
+
+def test_idempotent_sales():
+    """Test principal: reintentos secuenciales y simultáneos con la misma llave"""
+    print("\n" + "="*70)
+    print("TEST: IDEMPOTENCIA DE VENTAS (Idempotency-Key)")
+    print("="*70)
+
+    # 1. Autenticarse
+    print("\n1️⃣ Autenticando...")
+    token = login()
+    headers = get_headers(token)
+    print("✅ Token obtenido")
+
+    # 2. Crear producto de prueba
+    print(f"\n2️⃣ Creando producto de prueba con stock {STOCK_INICIAL}...")
+    stamp = datetime.now().timestamp()
+    response = requests.post(
+        f"{BASE_URL}/products",
+        headers=headers,
+        json={
+            "name": "Producto Test Idempotencia",
+            "price": 10.0,
+            "stock": STOCK_INICIAL,
+            "category": "Test",
+            "sku": f"TEST-IDEM-{stamp}",
+            "barcode": f"IDEM{stamp}"
+        }
+    )
+    product = response.json()
+    print(f"✅ Producto creado (ID: {product['id']})")
+    sale_ids = set()
+
+    # 3. Misma llave dos veces, una después de otra
+    print("\n3️⃣ Enviando la misma venta dos veces con la misma llave...")
+    key = f"test-idem-seq-{stamp}"
+    payload = sale_payload(product, 2)
+    first = post_sale(headers, key, payload)
+    second = post_sale(headers, key, payload)
+    sale_ids.update(r.json()["id"] for r in (first, second) if r.status_code == 201)
+    print(f"   Respuestas: {first.status_code}, {second.status_code} "
+          f"(Idempotent-Replayed: {second.headers.get('Idempotent-Replayed')})")
+    stock_after_sequential = get_stock(headers, product)
+    print(f"   Stock: {stock_after_sequential}")
+    sequential_ok = (
+        first.status_code == 201 and second.status_code == 201
+        and first.headers.get("Idempotent-Replayed") is None
+        and second.headers.get("Idempotent-Replayed") == "true"
+        and second.json()["id"] == first.json()["id"]
+        and stock_after_sequential == STOCK_INICIAL - 2
+    )
+
+    # 4. Misma llave con otro cuerpo
+    print("\n4️⃣ Reutilizando la llave con otra cantidad...")
+    different = post_sale(headers, key, sale_payload(product, 3))
+    print(f"   Respuesta: {different.status_code}")
+    different_ok = different.status_code == 422 and get_stock(headers, product) == STOCK_INICIAL - 2
+
+    # 5. Misma llave nueva enviada por varias cajas al mismo tiempo
+    print(f"\n5️⃣ Enviando {REINTENTOS} reintentos simultáneos con una llave nueva...")
+    key = f"test-idem-conc-{stamp}"
+    payload = sale_payload(product, 1)
+    with ThreadPoolExecutor(max_workers=REINTENTOS) as pool:
+        responses = list(pool.map(lambda _: post_sale(headers, key, payload), range(REINTENTOS)))
+
+    originals = [r for r in responses if r.status_code == 201 and r.headers.get("Idempotent-Replayed") is None]
+    replays = [r for r in responses if r.status_code == 201 and r.headers.get("Idempotent-Replayed") == "true"]
+    conflicts = [r for r in responses if r.status_code == 409]
+    sale_ids.update(r.json()["id"] for r in originals + replays)
+    print(f"   Originales: {len(originals)}, repetidas: {len(replays)}, en conflicto (409): {len(conflicts)}")
+
+    # Un reintento posterior siempre obtiene la respuesta original
+    retry = post_sale(headers, key, payload)
+    stock_final = get_stock(headers, product)
+    print(f"   Reintento final: {retry.status_code} (Idempotent-Replayed: {retry.headers.get('Idempotent-Replayed')})")
+    print(f"   Stock final: {stock_final}")
+    concurrent_ok = (
+        len(originals) == 1
+        and len(originals) + len(replays) + len(conflicts) == REINTENTOS
+        and all(r.json()["id"] == originals[0].json()["id"] for r in replays)
+        and retry.status_code == 201 and retry.headers.get("Idempotent-Replayed") == "true"
+        and retry.json()["id"] == originals[0].json()["id"]
+        and stock_final == STOCK_INICIAL - 3
+    )
+
+    ok = sequential_ok and different_ok and concurrent_ok and len(sale_ids) == 2
+    if ok:
+        print("✅ Cada llave registró una sola venta y descontó el stock una sola vez")
+    else:
+        print(f"❌ Resultado inconsistente (secuencial={sequential_ok}, otro cuerpo={different_ok}, "
+              f"simultáneo={concurrent_ok}, ventas={len(sale_ids)})")
+
+    # Limpiar: eliminar ventas y producto de prueba
+    print("\n   🧹 Limpiando...")
+    for sale_id in sale_ids:
+        requests.delete(f"{BASE_URL}/sales/{sale_id}", headers=headers)
+    requests.delete(f"{BASE_URL}/products/{product['id']}", headers=headers)
+    print("   ✅ Datos de prueba eliminados")
+
+    assert ok
+
+
+if __name__ == "__main__":
+    test_idempotent_sales()
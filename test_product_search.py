@@ -0,0 +1,123 @@
+"""
+Test de búsqueda de productos con filtros cuando el término coincide con más de 1000 productos.
+Los filtros de categoría y stock deben aplicarse sobre todas las coincidencias, no sobre un subconjunto.
+"""
+import csv
+import io
+import requests
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = "http://localhost:8000/api/v1"
+
+# Productos que coinciden con el término y cuántos de ellos están en la categoría filtrada
+TOTAL_COINCIDENCIAS = 1500
+EN_CATEGORIA = 50
+
+
+def login():
+    """Autenticar y obtener token"""
+    response = requests.post(
+        f"{BASE_URL}/auth/login",
+        data={
+            "username": "admin",
+            "password": "admin123"
+        }
+    )
+    return response.json()["access_token"]
+
+
+def get_headers(token):
+    """Obtener headers con token"""
+    return {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    }
+
+
+def import_products(token, rows):
+    """Crear productos con una importación CSV; regresa el resumen"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=["sku", "name", "category", "quantity", "price"])
+    writer.writeheader()
+    writer.writerows(rows)
+    response = requests.post(
+        f"{BASE_URL}/imports/products",
+        headers={"Authorization": f"Bearer {token}"},
+        files={"file": ("busqueda.csv", buffer.getvalue().encode("utf-8"), "text/csv")}
+    )
+    return response.json()
+
+
+def test_filtered_search_many_matches():
+    """Test principal: búsqueda filtrada por categoría con más de 1000 coincidencias"""
+    print("\n" + "="*70)
+    print("TEST: BÚSQUEDA FILTRADA CON MÁS DE 1000 COINCIDENCIAS")
+    print("="*70)
+
+    # 1. Autenticarse
+    print("\n1️⃣ Autenticando...")
+    token = login()
+    headers = get_headers(token)
+    print("✅ Token obtenido")
+
+    # 2. Importar productos de prueba con un término único
+    stamp = int(datetime.now().timestamp())
+    term = f"busq{stamp}"
+    category = f"TestBusqueda{stamp}"
+    print(f"\n2️⃣ Importando {TOTAL_COINCIDENCIAS} productos '{term} N' ({EN_CATEGORIA} en {category})...")
+    rows = [
+        {
+            "sku": f"TEST-BUSQ-{stamp}-{i}",
+            "name": f"{term} {i}",
+            # Los productos de la categoría filtrada quedan al final de la tabla
+            "category": category if i >= TOTAL_COINCIDENCIAS - EN_CATEGORIA else "Test",
+            "quantity": 5,
+            "price": 10.0,
+        }
+        for i in range(TOTAL_COINCIDENCIAS)
+    ]
+    summary = import_products(token, rows)
+    print(f"✅ Insertados: {summary.get('inserted')}")
+
+    # 3. Buscar con filtro de categoría
+    print("\n3️⃣ Buscando con filtro de categoría...")
+    response = requests.get(
+        f"{BASE_URL}/products/search",
+        headers=headers,
+        params={"q": term, "category": category, "limit": 100}
+    )
+    filtered = response.json()["items"]
+    print(f"   Resultados: {len(filtered)}")
+
+    # 4. Buscar sin filtro: se llena el límite y todos coinciden con el término
+    print("\n4️⃣ Buscando sin filtro...")
+    response = requests.get(f"{BASE_URL}/products/search", headers=headers, params={"q": term, "limit": 100})
+    unfiltered = response.json()["items"]
+    print(f"   Resultados: {len(unfiltered)}")
+
+    ok = (
+        summary.get("inserted") == TOTAL_COINCIDENCIAS
+        and len(filtered) == EN_CATEGORIA
+        and all(p["category"] == category for p in filtered)
+        and len(unfiltered) == 100
+        and all(p["name"].startswith(term) for p in unfiltered)
+    )
+    if ok:
+        print("✅ El filtro de categoría se aplicó sobre todas las coincidencias")
+    else:
+        print("❌ Faltan resultados de la búsqueda filtrada")
+
+    # Limpiar: eliminar productos de prueba
+    print("\n   🧹 Limpiando...")
+    response = requests.get(f"{BASE_URL}/products/search", headers=headers, params={"q": term, "limit": TOTAL_COINCIDENCIAS})
+    ids = [p["id"] for p in response.json()["items"]]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda pid: requests.delete(f"{BASE_URL}/products/{pid}", headers=headers), ids))
+    print("   ✅ Datos de prueba eliminados")
+
+    assert ok
+
+
+if __name__ == "__main__":
+    test_filtered_search_many_matches()
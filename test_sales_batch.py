@@ -0,0 +1,193 @@
+"""
+Test del registro por lote (POST /sales/batch) de tickets capturados sin conexión.
+Un ticket sin stock se rechaza sin afectar a los demás, el lote compite bien con ventas
+simultáneas y un reintento con la misma Idempotency-Key no registra las ventas dos veces.
+"""
+import requests
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = "http://localhost:8000/api/v1"
+
+# Tickets del lote y cajas vendiendo el mismo producto al mismo tiempo
+TICKETS_CONCURRENTES = 10
+CAJAS = 5
+STOCK_CONCURRENTE = 8
+
+
+def login():
+    """Autenticar y obtener token"""
+    response = requests.post(
+        f"{BASE_URL}/auth/login",
+        data={
+            "username": "admin",
+            "password": "admin123"
+        }
+    )
+    return response.json()["access_token"]
+
+
+def get_headers(token):
+    """Obtener headers con token"""
+    return {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    }
+
+
+def create_product(headers, name, stock, stamp):
+    """Crear un producto de prueba con stock dado"""
+    response = requests.post(
+        f"{BASE_URL}/products",
+        headers=headers,
+        json={
+            "name": name,
+            "price": 10.0,
+            "stock": stock,
+            "category": "Test",
+            "sku": f"TEST-BATCH-{name}-{stamp}",
+            "barcode": f"BATCH{name}{stamp}"
+        }
+    )
+    return response.json()
+
+
+def ticket(*lines):
+    """Ticket con líneas (producto, cantidad)"""
+    items = [{
+        "product_id": product["id"],
+        "product_name": product["name"],
+        "quantity": quantity,
+        "unit_price": product["price"],
+        "subtotal": product["price"] * quantity
+    } for product, quantity in lines]
+    subtotal = sum(item["subtotal"] for item in items)
+    return {
+        "items": items,
+        "subtotal": subtotal,
+        "tax": 0.0,
+        "discount": 0.0,
+        "total": subtotal,
+        "payment_method": "cash"
+    }
+
+
+def get_stock(headers, product):
+    response = requests.get(f"{BASE_URL}/products/{product['id']}", headers=headers)
+    return response.json()["stock"]
+
+
+def get_transactions_today(headers):
+    response = requests.get(f"{BASE_URL}/sales/stats/today", headers=headers)
+    return response.json()["transactions_today"]
+
+
+def test_sales_batch():
+    """Test principal: resultados por ticket, stock final e idempotencia del lote"""
+    print("\n" + "="*70)
+    print("TEST: REGISTRO DE VENTAS POR LOTE")
+    print("="*70)
+
+    # 1. Autenticarse
+    print("\n1️⃣ Autenticando...")
+    token = login()
+    headers = get_headers(token)
+    print("✅ Token obtenido")
+
+    # 2. Crear productos de prueba
+    print("\n2️⃣ Creando productos de prueba...")
+    stamp = datetime.now().timestamp()
+    product_a = create_product(headers, "LoteA", 5, stamp)
+    product_b = create_product(headers, "LoteB", 2, stamp)
+    product_c = create_product(headers, "LoteC", STOCK_CONCURRENTE, stamp)
+    print(f"✅ Productos creados (IDs: {product_a['id']}, {product_b['id']}, {product_c['id']})")
+    transactions_before = get_transactions_today(headers)
+    created_ids = []
+
+    # 3. Lote con un ticket sin stock en medio
+    print("\n3️⃣ Enviando lote de 3 tickets (el segundo sin stock)...")
+    batch = {"sales": [
+        ticket((product_a, 3)),
+        ticket((product_b, 5)),
+        ticket((product_a, 2), (product_b, 1)),
+    ]}
+    key_headers = {**headers, "Idempotency-Key": f"test-batch-{stamp}"}
+    response = requests.post(f"{BASE_URL}/sales/batch", headers=key_headers, json=batch)
+    first = response.json()
+    oks = [r["ok"] for r in first["results"]]
+    created_ids += [r["sale_id"] for r in first["results"] if r["ok"]]
+    print(f"   Resultados: {oks} (creadas {first['created']}, rechazadas {first['failed']})")
+    stock_a, stock_b = get_stock(headers, product_a), get_stock(headers, product_b)
+    print(f"   Stock final: A={stock_a} B={stock_b}")
+    isolated_ok = (
+        response.status_code == 200 and oks == [True, False, True]
+        and first["created"] == 2 and first["failed"] == 1
+        and stock_a == 0 and stock_b == 1
+    )
+
+    # 4. Reintento del mismo lote con la misma Idempotency-Key
+    print("\n4️⃣ Reintentando el lote con la misma Idempotency-Key...")
+    response = requests.post(f"{BASE_URL}/sales/batch", headers=key_headers, json=batch)
+    replayed = response.headers.get("Idempotent-Replayed") == "true"
+    print(f"   Idempotent-Replayed: {response.headers.get('Idempotent-Replayed')}")
+    replay_ok = (
+        response.status_code == 200 and replayed and response.json() == first
+        and get_stock(headers, product_a) == 0 and get_stock(headers, product_b) == 1
+    )
+
+    # 5. Lote compitiendo con ventas simultáneas del mismo producto
+    print(f"\n5️⃣ Lote de {TICKETS_CONCURRENTES} tickets contra {CAJAS} ventas simultáneas (stock {STOCK_CONCURRENTE})...")
+    concurrent_batch = {"sales": [ticket((product_c, 1)) for _ in range(TICKETS_CONCURRENTES)]}
+
+    def send_batch():
+        return requests.post(f"{BASE_URL}/sales/batch", headers=headers, json=concurrent_batch)
+
+    def sell_one():
+        return requests.post(f"{BASE_URL}/sales/", headers=headers, json=ticket((product_c, 1)))
+
+    with ThreadPoolExecutor(max_workers=CAJAS + 1) as pool:
+        batch_future = pool.submit(send_batch)
+        single_futures = [pool.submit(sell_one) for _ in range(CAJAS)]
+        batch_response = batch_future.result()
+        single_responses = [f.result() for f in single_futures]
+
+    singles = [r.json()["id"] for r in single_responses if r.status_code == 201]
+    created_ids += singles
+    batch_created = 0
+    if batch_response.status_code == 200:
+        batch_created = batch_response.json()["created"]
+        created_ids += [r["sale_id"] for r in batch_response.json()["results"] if r["ok"]]
+    stock_c = get_stock(headers, product_c)
+    print(f"   Lote: HTTP {batch_response.status_code}, creadas {batch_created}; ventas sueltas: {len(singles)}")
+    print(f"   Stock final: C={stock_c}")
+    concurrent_ok = (
+        batch_response.status_code in (200, 409)
+        and batch_created + len(singles) == STOCK_CONCURRENTE - stock_c
+        and stock_c >= 0
+    )
+
+    # 6. El acumulado diario cuenta cada venta registrada una sola vez
+    transactions_after = get_transactions_today(headers)
+    print(f"\n6️⃣ Transacciones de hoy: {transactions_before} -> {transactions_after} (ventas creadas: {len(created_ids)})")
+    rollup_ok = transactions_after - transactions_before == len(created_ids)
+
+    ok = isolated_ok and replay_ok and concurrent_ok and rollup_ok
+    if ok:
+        print("✅ Lote consistente: tickets aislados, sin sobreventa y sin duplicados al reintentar")
+    else:
+        print(f"❌ Resultado inconsistente (aislamiento={isolated_ok}, reintento={replay_ok}, "
+              f"concurrencia={concurrent_ok}, acumulado={rollup_ok})")
+
+    # Limpiar: eliminar ventas y productos de prueba
+    print("\n   🧹 Limpiando...")
+    for sale_id in created_ids:
+        requests.delete(f"{BASE_URL}/sales/{sale_id}", headers=headers)
+    for product in (product_a, product_b, product_c):
+        requests.delete(f"{BASE_URL}/products/{product['id']}", headers=headers)
+    print("   ✅ Datos de prueba eliminados")
+
+    assert ok
+
+
+if __name__ == "__main__":
+    test_sales_batch()
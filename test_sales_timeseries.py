@@ -0,0 +1,127 @@
+"""
+Test de la serie de tiempo de ventas (GET /sales/timeseries) frente a los KPIs del día.
+Una venta cancelada no debe contar ni en /sales/stats/today ni en el bucket de hoy de la serie.
+"""
+import requests
+from datetime import datetime
+
+BASE_URL = "http://localhost:8000/api/v1"
+
+
+def login():
+    """Autenticar y obtener token"""
+    response = requests.post(
+        f"{BASE_URL}/auth/login",
+        data={
+            "username": "admin",
+            "password": "admin123"
+        }
+    )
+    return response.json()["access_token"]
+
+
+def get_headers(token):
+    """Obtener headers con token"""
+    return {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    }
+
+
+def sell(headers, product, quantity):
+    """Registrar una venta de `quantity` unidades; regresa la venta creada"""
+    subtotal = product["price"] * quantity
+    response = requests.post(
+        f"{BASE_URL}/sales/",
+        headers=headers,
+        json={
+            "items": [{
+                "product_id": product["id"],
+                "product_name": product["name"],
+                "quantity": quantity,
+                "unit_price": product["price"],
+                "subtotal": subtotal
+            }],
+            "subtotal": subtotal,
+            "tax": 0.0,
+            "discount": 0.0,
+            "total": subtotal,
+            "payment_method": "cash"
+        }
+    )
+    return response.json()
+
+
+def today_totals(headers):
+    """(transacciones de stats/today, punto de hoy de la serie diaria)"""
+    stats = requests.get(f"{BASE_URL}/sales/stats/today", headers=headers).json()
+    # Sin fechas la serie diaria termina ahora: el último punto es el día de hoy de la tienda
+    series = requests.get(f"{BASE_URL}/sales/timeseries", headers=headers, params={"bucket": "day"}).json()
+    return stats["transactions_today"], series["points"][-1]
+
+
+def test_timeseries_excludes_cancelled():
+    """Test principal: cancelar una venta y comparar la serie con los KPIs del día"""
+    print("\n" + "="*70)
+    print("TEST: SERIE DE TIEMPO SIN VENTAS CANCELADAS")
+    print("="*70)
+
+    # 1. Autenticarse
+    print("\n1️⃣ Autenticando...")
+    token = login()
+    headers = get_headers(token)
+    print("✅ Token obtenido")
+
+    # 2. Crear producto de prueba
+    print("\n2️⃣ Creando producto de prueba...")
+    stamp = datetime.now().timestamp()
+    response = requests.post(
+        f"{BASE_URL}/products",
+        headers=headers,
+        json={
+            "name": "Producto Test Serie",
+            "price": 10.0,
+            "stock": 20,
+            "category": "Test",
+            "sku": f"TEST-SERIE-{stamp}",
+            "barcode": f"SERIE{stamp}"
+        }
+    )
+    product = response.json()
+    print(f"✅ Producto creado (ID: {product['id']})")
+    stats_before, point_before = today_totals(headers)
+
+    # 3. Dos ventas y cancelar una
+    print("\n3️⃣ Registrando dos ventas y cancelando la segunda...")
+    kept = sell(headers, product, 1)
+    cancelled = sell(headers, product, 2)
+    response = requests.put(f"{BASE_URL}/sales/{cancelled['id']}", headers=headers, json={"status": "cancelled"})
+    print(f"   Cancelación: {response.status_code}")
+
+    # 4. Comparar KPIs del día y bucket de hoy
+    stats_after, point_after = today_totals(headers)
+    stats_delta = stats_after - stats_before
+    series_delta = point_after["transactions"] - point_before["transactions"]
+    units_delta = point_after["units_sold"] - point_before["units_sold"]
+    revenue_delta = round(point_after["revenue"] - point_before["revenue"], 2)
+    print(f"\n4️⃣ Transacciones nuevas: stats/today={stats_delta}, serie={series_delta}")
+    print(f"   Unidades e ingresos nuevos en la serie: {units_delta}, {revenue_delta}")
+
+    ok = stats_delta == 1 and series_delta == 1 and units_delta == 1 and revenue_delta == product["price"]
+    if ok:
+        print("✅ La serie coincide con los KPIs: la venta cancelada no cuenta")
+    else:
+        print("❌ La serie cuenta la venta cancelada")
+
+    # Limpiar: eliminar ventas y producto de prueba
+    print("\n   🧹 Limpiando...")
+    for sale in (kept, cancelled):
+        requests.delete(f"{BASE_URL}/sales/{sale['id']}", headers=headers)
+    requests.delete(f"{BASE_URL}/products/{product['id']}", headers=headers)
+    print("   ✅ Datos de prueba eliminados")
+
+    assert ok
+
+
+if __name__ == "__main__":
+    test_timeseries_excludes_cancelled()